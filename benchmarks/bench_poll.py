@@ -0,0 +1,242 @@
+"""
+Poll path benchmarks for the Wiser Smart integration
+
+Sets the integration up in a Home Assistant core against a fake controller
+serving synthetic installs, then measures setup time, refresh latency,
+dispatcher fan-out, state writes per poll, command round trip and peak
+memory. Results are written as JSON so that runs can be compared between
+versions.
+
+Usage:
+    python benchmarks/bench_poll.py --rooms 5 50 500 --output results.json
+
+Needs homeassistant (and so aiohttp) installed.
+
+https://github.com/tomtomfx/wiserSmartForHA
+thomas.fayoux@gmail.com
+
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from homeassistant import bootstrap, config_entries  # noqa: E402
+from homeassistant.const import EVENT_STATE_CHANGED, __version__ as HA_VERSION  # noqa: E402
+from homeassistant.core import CoreState, HomeAssistant  # noqa: E402
+
+from custom_components.wisersmart.api import (  # noqa: E402
+    SECTION_APPLIANCES,
+    SECTION_DEVICES,
+    SECTION_TEMPERATURES,
+)
+from custom_components.wisersmart.const import DOMAIN, VERSION  # noqa: E402
+from custom_components.wisersmart.snapshot import (  # noqa: E402
+    SECTION_PARSERS,
+    WiserSmartSnapshot,
+)
+from fake_controller import CONTROLLER_NAME, FakeController, FakeInstall  # noqa: E402
+
+DEFAULT_ROOMS = [5, 50, 500]
+DEFAULT_POLLS = 20
+DEFAULT_COMMANDS = 5
+# Share of rooms and appliances changing between two polls
+CHURN = 0.1
+ITEM_SECTIONS = [SECTION_TEMPERATURES, SECTION_DEVICES, SECTION_APPLIANCES]
+
+
+def summarize(values):
+    """Return count, mean, p50, p95 and max of a list of numbers"""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def percentile(pct):
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    return {
+        "count": len(ordered),
+        "mean": sum(ordered) / len(ordered),
+        "p50": percentile(50),
+        "p95": percentile(95),
+        "max": ordered[-1],
+    }
+
+
+async def async_make_hass(config_dir):
+    """Minimal Home Assistant core able to load config entries"""
+    try:
+        hass = HomeAssistant(config_dir)
+    except TypeError:
+        hass = HomeAssistant()
+        hass.config.config_dir = config_dir
+    hass.config.skip_pip = True
+    os.symlink(
+        os.path.join(ROOT, "custom_components"),
+        os.path.join(config_dir, "custom_components"),
+    )
+    hass.config_entries = config_entries.ConfigEntries(hass, {})
+    await hass.config_entries.async_initialize()
+    await bootstrap.load_registries(hass)
+    hass.state = CoreState.running
+    return hass
+
+
+async def async_bench_install(rooms, polls, commands):
+    install = FakeInstall(rooms)
+    controller = FakeController(install)
+    host = await controller.async_start()
+    result = {
+        "rooms": rooms,
+        "devices": len(install.devices),
+        "appliances": len(install.appliances),
+    }
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = await async_make_hass(config_dir)
+        state_writes = []
+        hass.bus.async_listen(EVENT_STATE_CHANGED, lambda event: state_writes.append(event))
+
+        # Long intervals, only the benchmark triggers polls
+        entry = config_entries.ConfigEntry(
+            version=1,
+            domain=DOMAIN,
+            title=CONTROLLER_NAME,
+            data={
+                "name": CONTROLLER_NAME,
+                "host": host,
+                "username": "admin",
+                "password": "admin",
+                "scan_interval": 3600,
+                "power_scan_interval": 3600,
+                "device_scan_interval": 3600,
+            },
+            source="user",
+            options={},
+            unique_id=CONTROLLER_NAME,
+        )
+        start = time.perf_counter()
+        await hass.config_entries.async_add(entry)
+        await hass.async_block_till_done()
+        result["setup_s"] = time.perf_counter() - start
+        result["entities"] = len(hass.states.async_entity_ids())
+        handle = hass.data[DOMAIN][entry.entry_id]
+
+        fanout = []
+        notify = handle._async_notify
+
+        def timed_notify(changed):
+            start = time.perf_counter()
+            notified = notify(changed)
+            fanout.append(time.perf_counter() - start)
+            return notified
+
+        handle._async_notify = timed_notify
+
+        refresh, poll_total, writes_per_poll, payload = [], [], [], []
+        for _ in range(polls):
+            install.churn(CHURN)
+            del state_writes[:]
+            sent = controller.bytes_sent
+            start = time.perf_counter()
+            await handle.async_update(no_throttle=True)
+            refresh.append(time.perf_counter() - start)
+            await hass.async_block_till_done()
+            poll_total.append(time.perf_counter() - start)
+            writes_per_poll.append(len(state_writes))
+            payload.append(controller.bytes_sent - sent)
+
+        result["refresh_s"] = summarize(refresh)
+        result["poll_with_state_writes_s"] = summarize(poll_total)
+        result["fanout_s"] = summarize(fanout)
+        result["state_writes_per_poll"] = summarize(writes_per_poll)
+        result["payload_bytes"] = summarize(payload)
+
+        # A blocking service call returns once its batch has been written
+        climates = sorted(hass.states.async_entity_ids("climate"))[:commands]
+        round_trips = []
+        for index, entity_id in enumerate(climates):
+            start = time.perf_counter()
+            await hass.services.async_call(
+                "climate",
+                "set_temperature",
+                {"entity_id": entity_id, "temperature": 20 + index % 3},
+                blocking=True,
+            )
+            round_trips.append(time.perf_counter() - start)
+        result["command_round_trip_s"] = summarize(round_trips)
+
+        tracemalloc.start()
+        install.churn(CHURN)
+        await handle.async_update(no_throttle=True)
+        await hass.async_block_till_done()
+        result["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        # Fetching the item sections into a snapshot, the whole bodies decoded
+        # at once or parsed while they are received
+        result["fetch_peak_memory_bytes"] = {}
+        for mode, parsers in (("buffered", None), ("streamed", SECTION_PARSERS)):
+            tracemalloc.start()
+            snapshot = WiserSmartSnapshot.from_data(
+                await handle.client.async_get_data(ITEM_SECTIONS, parsers)
+            )
+            retained, peak = tracemalloc.get_traced_memory()
+            # Retained is mostly the snapshot records
+            result["fetch_peak_memory_bytes"][mode] = {"peak": peak, "retained": retained}
+            tracemalloc.stop()
+            del snapshot
+
+        await hass.config_entries.async_unload(entry.entry_id)
+        await hass.async_stop(force=True)
+
+    await controller.async_stop()
+    return result
+
+
+async def async_main(args):
+    results = []
+    for rooms in args.rooms:
+        logging.getLogger(__name__).warning("Benchmarking {} rooms".format(rooms))
+        results.append(await async_bench_install(rooms, args.polls, args.commands))
+    return {
+        "integration_version": VERSION,
+        "homeassistant_version": HA_VERSION,
+        "python_version": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "polls": args.polls,
+        "churn": CHURN,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rooms", type=int, nargs="+", default=DEFAULT_ROOMS)
+    parser.add_argument("--polls", type=int, default=DEFAULT_POLLS)
+    parser.add_argument("--commands", type=int, default=DEFAULT_COMMANDS)
+    parser.add_argument("--output", help="JSON file to write, stdout by default")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    report = asyncio.run(async_main(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output:
+            output.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Stand-in Wiser Smart Controller for the benchmarks
+
+Serves the RPC endpoints the integration talks to from a synthetic install
+kept in memory, so the poll path can be measured without real hardware.
+
+https://github.com/tomtomfx/wiserSmartForHA
+thomas.fayoux@gmail.com
+
+"""
+import json
+import random
+
+from aiohttp import web
+
+CONTROLLER_NAME = "WISER-BENCH"
+
+
+class FakeInstall:
+    """
+    Synthetic install: every room has a thermostat and a heater, one room in
+    three has a valve actuator, one in two a smart plug and one in ten a
+    water heater
+    """
+
+    def __init__(self, rooms, seed=0):
+        self._random = random.Random(seed)
+        self.home_mode = "schedule"
+        self.rooms = {}
+        self.devices = []
+        self.appliances = {}
+        for index in range(rooms):
+            room = "Room {}".format(index)
+            self.rooms[room] = {
+                "locationName": room,
+                "locationId": index,
+                "currentValue": round(self._random.uniform(16, 22), 1),
+                "targetValue": 19.0,
+            }
+            self._add_device("Thermostat {}".format(index), "EH-ZB-RTS", room, "Battery")
+            self._add_device("Heater {}".format(index), "EH-ZB-HACT", room, "Mains")
+            if index % 3 == 0:
+                self._add_device("Valve {}".format(index), "EH-ZB-VACT", room, "Battery")
+                self.rooms[room]["valve"] = [
+                    {
+                        "valvePosition": self._random.randint(0, 100),
+                        "calibrationStatus": "calibrated",
+                        "internalTemp": self.rooms[room]["currentValue"],
+                    }
+                ]
+            if index % 2 == 0:
+                self._add_appliance("Plug {}".format(index), "EH-ZB-SPD")
+            if index % 10 == 0:
+                self._add_appliance("Water heater {}".format(index), "EH-ZB-LMACT")
+
+    def _add_device(self, name, model, location=None, power_type="Mains"):
+        device = {
+            "name": name,
+            "modelId": model,
+            "powerType": power_type,
+            "status": "ONLINE",
+        }
+        if location is not None:
+            device["location"] = location
+        if power_type == "Battery":
+            device["batteryLevel"] = self._random.randint(1, 3)
+        self.devices.append(device)
+
+    def _add_appliance(self, name, model):
+        self._add_device(name, model)
+        self.appliances[name] = {
+            "applianceName": name,
+            "applianceId": len(self.appliances) + 1,
+            "state": False,
+            "powerConsump": 0,
+        }
+
+    def churn(self, fraction):
+        """Change the temperature and power of a fraction of the items"""
+        for room in self._random.sample(
+            list(self.rooms.values()), max(1, int(len(self.rooms) * fraction))
+        ):
+            room["currentValue"] = round(room["currentValue"] + self._random.choice([-0.1, 0.1]), 1)
+        if self.appliances:
+            for appliance in self._random.sample(
+                list(self.appliances.values()), max(1, int(len(self.appliances) * fraction))
+            ):
+                appliance["powerConsump"] = self._random.randint(0, 2000)
+
+    def handle(self, rpc, body):
+        """Return the JSON answer to one RPC call"""
+        if rpc == "diagnostic/get_properties":
+            return {
+                "propertyDetails": [
+                    {"name": "ehc.gw.host.name", "value": CONTROLLER_NAME},
+                    {"name": "ehc.wcs2.cloud.status", "value": "up"},
+                    {"name": "ehc.version.macaddress", "value": "00:00:00:00:00:00"},
+                ]
+            }
+        if rpc == "mode/get_home_mode":
+            return {"homeMode": self.home_mode}
+        if rpc == "homedevice/device_list":
+            return {"device": self.devices}
+        if rpc == "hvac/get_all_loc_temp":
+            return {"locationTempDetails": list(self.rooms.values())}
+        if rpc == "loadmanagement/get_appliances":
+            return {"applianceDetails": list(self.appliances.values())}
+        if rpc == "hvac/set_loc_temp":
+            for target in body["targetTemp"]:
+                self.rooms[target["locationId"]]["targetValue"] = target["targetValue"]
+            return {}
+        if rpc == "loadmanagement/set_appliance_state":
+            states = {item["applianceId"]: item["state"] for item in body["applianceState"]}
+            for appliance in self.appliances.values():
+                if appliance["applianceId"] in states:
+                    appliance["state"] = states[appliance["applianceId"]]
+            return {}
+        if rpc == "mode/set_home_mode":
+            self.home_mode = body["homeMode"]
+            return {}
+        return None
+
+
+class FakeController:
+    """aiohttp server answering for a FakeInstall"""
+
+    def __init__(self, install):
+        self.install = install
+        self.requests = 0
+        self.bytes_sent = 0
+        self._runner = None
+
+    async def _handle(self, request):
+        body = await request.json()
+        answer = self.install.handle(request.match_info["rpc"], body)
+        if answer is None:
+            raise web.HTTPNotFound()
+        text = json.dumps(answer)
+        self.requests += 1
+        self.bytes_sent += len(text)
+        return web.Response(text=text, content_type="application/json")
+
+    async def async_start(self, host="127.0.0.1"):
+        """Start serving on a free port, return the host:port to connect to"""
+        app = web.Application()
+        app.router.add_post("/rpc/{rpc:.*}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return "{}:{}".format(host, port)
+
+    async def async_stop(self):
+        await self._runner.cleanup()
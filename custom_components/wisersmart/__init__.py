@@ -11,47 +11,113 @@ import json
 
 # import time
 from datetime import datetime, timedelta
+from time import monotonic
 from functools import partial
 import voluptuous as vol
-from wiserSmartAPI.wiserSmart import (
-    wiserSmart,
-    TEMP_MINIMUM,
-    TEMP_MAXIMUM,
-    WiserControllerTimeoutException,
-    WiserControllerAuthenticationException,
-    WiserRESTException,
-)
 from homeassistant.config_entries import SOURCE_IMPORT
 from homeassistant.const import (
+    ATTR_ENTITY_ID,
     CONF_HOST,
     CONF_NAME,
     CONF_USERNAME,
     CONF_PASSWORD,
     CONF_SCAN_INTERVAL,
+    ENTITY_MATCH_ALL,
 )
 from homeassistant.core import callback
+from homeassistant.exceptions import ConfigEntryNotReady, HomeAssistantError
 from homeassistant.helpers import config_validation as cv
-from homeassistant.helpers.dispatcher import dispatcher_send
+from homeassistant.helpers import device_registry, entity_registry
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.dispatcher import DATA_DISPATCHER, async_dispatcher_send
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.service import async_extract_referenced_entity_ids
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.discovery import async_load_platform
 from homeassistant.helpers.device_registry import CONNECTION_NETWORK_MAC
 
 from .const import (
     _LOGGER,
+    CACHE_SAVE_DELAY,
+    CONF_CONFIRM_DELAY,
+    CONF_DEVICE_SCAN_INTERVAL,
+    CONF_LEGACY_UNIQUE_IDS,
+    CONF_OPTIMISTIC_UPDATES,
+    CONF_POLL_BUDGET,
+    CONF_POWER_DEADBAND,
+    CONF_POWER_DEADBAND_PERCENT,
+    CONF_POWER_SCAN_INTERVAL,
+    CONF_STATE_MAX_AGE,
+    CONF_TEMPERATURE_DEADBAND,
+    DEFAULT_CONFIRM_DELAY,
+    DEFAULT_DEVICE_SCAN_INTERVAL,
+    DEFAULT_OPTIMISTIC_UPDATES,
+    DEFAULT_POLL_BUDGET,
+    DEFAULT_POWER_DEADBAND,
+    DEFAULT_POWER_DEADBAND_PERCENT,
+    DEFAULT_POWER_SCAN_INTERVAL,
     DATA_WISER_SMART_CONFIG,
     DEFAULT_SCAN_INTERVAL,
+    DEFAULT_STATE_MAX_AGE,
+    DEFAULT_TEMPERATURE_DEADBAND,
     DOMAIN,
     CONTROLLERNAME,
+    EVENT_COMMAND_LATENCIES,
+    EVENT_POLL_OVER_BUDGET,
     MANUFACTURER,
     NOTIFICATION_ID,
     NOTIFICATION_TITLE,
+    POLL_STAGGER,
+    STORAGE_KEY,
+    STORAGE_VERSION,
+    TIER_APPLIANCES,
+    TIER_DEVICES,
+    TIER_ROOMS,
     VERSION,
     WISER_SMART_PLATFORMS,
     WISER_SMART_SERVICES,
 )
-
-# Set config values to default
-# These get set to config later
-SCAN_INTERVAL = DEFAULT_SCAN_INTERVAL
+from .api import (
+    ALL_SECTIONS,
+    SECTION_HOME_MODE,
+    Error as WiserError,
+    WiserSmartClient,
+    WiserSmartTransfer,
+    TEMP_MINIMUM,
+    TEMP_MAXIMUM,
+    WiserControllerDataInvalid,
+    WiserControllerTimeoutException,
+    WiserControllerAuthenticationException,
+    WiserRESTException,
+    clamp_temperature,
+)
+from .commands import WiserSmartCommandQueue
+from .health import WiserSmartConnectionHealth
+from .scheduler import TIER_SECTIONS, WiserSmartPollScheduler
+from .topology import WiserSmartTopology, controller_unique_id
+from .tracing import WiserSmartCommandTracer
+from .writes import DEADBAND_POWER, DEADBAND_TEMPERATURE, Deadband
+from .stats import (
+    OUTCOME_SKIPPED,
+    STAT_NOTIFIED,
+    STAT_PARSE,
+    STAT_PAYLOAD,
+    STAT_RESPONSE,
+    STAT_SIGNAL,
+    STAT_SNAPSHOT,
+    STAT_TOTAL,
+    WiserSmartPollStats,
+)
+from .snapshot import (
+    KIND_APPLIANCE,
+    KIND_CONTROLLER,
+    KIND_POLL_STATS,
+    KIND_ROOM,
+    KIND_SECTIONS,
+    SECTION_PARSERS,
+    WiserSmartSnapshot,
+    update_signal,
+)
 
 PLATFORM_SCHEMA = vol.Schema(
     {
@@ -59,11 +125,51 @@ PLATFORM_SCHEMA = vol.Schema(
         vol.Required(CONF_USERNAME): cv.string,
         vol.Required(CONF_PASSWORD): cv.string,
         vol.Optional(CONF_SCAN_INTERVAL, default=DEFAULT_SCAN_INTERVAL): vol.All(
-            vol.Coerce(int)
+            vol.Coerce(int), vol.Range(min=1)
         ),
     }
 )
 
+ATTR_APPLIANCE_STATE = "appliance_state"
+SET_APPLIANCE_MODE_SCHEMA = cv.make_entity_service_schema(
+    {
+        vol.Required(ATTR_APPLIANCE_STATE, default=False): cv.boolean,
+    }
+)
+
+ATTR_HOME_MODE = "mode"
+ATTR_COME_BACK_TIME = "come_back_time"
+ATTR_CONFIG_ENTRY_ID = "config_entry_id"
+SET_HOME_MODE_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_HOME_MODE): vol.Coerce(str),
+        vol.Required(ATTR_COME_BACK_TIME, default=0): vol.Coerce(int),
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+    }
+)
+
+DUMP_COMMAND_LATENCIES_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+    }
+)
+
+ATTR_TEMPERATURES = "temperatures"
+SET_ROOM_TEMPERATURES_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_TEMPERATURES): vol.Schema({cv.string: vol.Coerce(float)}),
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+    }
+)
+
+ATTR_STATES = "states"
+SET_APPLIANCE_STATES_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_STATES): vol.Schema({cv.string: cv.boolean}),
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+    }
+)
+
 async def async_setup(hass, config):
     """
     Wiser smart uses config flow for configuration.
@@ -74,6 +180,9 @@ async def async_setup(hass, config):
     continue setting up the integration via the config flow.
     """
     hass.data[DATA_WISER_SMART_CONFIG] = config.get(DOMAIN, {})
+    # Controller handles, keyed by config entry id
+    hass.data.setdefault(DOMAIN, {})
+    async_register_services(hass)
 
     if not hass.config_entries.async_entries(DOMAIN) and hass.data[DATA_WISER_SMART_CONFIG]:
         # No config entry exists and configuration.yaml config exists, trigger the import flow.
@@ -88,94 +197,287 @@ async def async_setup(hass, config):
     return True
 
 
-async def async_setup_entry(hass, config_entry):
+@callback
+def async_register_services(hass):
+    """Register the services shared by every Wiser Smart controller"""
 
-    global SCAN_INTERVAL
+    async def set_appliance_state(service):
+        appliance_state = service.data[ATTR_APPLIANCE_STATE]
 
-    """Set up the Wiser Smart component."""
-    if DOMAIN not in hass.data:
-        hass.data[DOMAIN] = {}
+        if service.data.get(ATTR_ENTITY_ID) == ENTITY_MATCH_ALL:
+            # Every appliance of every controller
+            batches = {
+                data: {
+                    appliance.appliance_id: appliance_state
+                    for appliance in data.appliance_entities.values()
+                }
+                for data in hass.data[DOMAIN].values()
+                if data.appliance_entities
+            }
+        else:
+            batches = select_appliances(service, appliance_state)
+        # One batched command per controller
+        await asyncio.gather(
+            *[data.set_appliance_states(states) for data, states in batches.items()]
+        )
 
-    SCAN_INTERVAL = int(
-        config_entry.data.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)
+    def select_appliances(service, appliance_state):
+        """
+        Resolve the entity ids, areas and devices targeted through the
+        appliance index of each controller. Areas and devices also hold
+        entities of other integrations, only entity ids are reported unknown
+        :return: dict of controller handle to dict of appliance id to state
+        """
+        selected = async_extract_referenced_entity_ids(hass, service)
+        batches = {}
+        unknown = []
+        for entity_id in selected.referenced | selected.indirectly_referenced:
+            for data in hass.data[DOMAIN].values():
+                appliance = data.appliance_entities.get(entity_id)
+                if appliance is not None:
+                    batches.setdefault(data, {})[appliance.appliance_id] = appliance_state
+                    break
+            else:
+                if entity_id in selected.referenced:
+                    unknown.append(entity_id)
+        if unknown:
+            _LOGGER.error(
+                "No Wiser Smart appliance found for {}".format(", ".join(sorted(unknown)))
+            )
+        return batches
+
+    async def set_home_mode(service):
+        home_mode = service.data[ATTR_HOME_MODE]
+        come_back_time = service.data[ATTR_COME_BACK_TIME]
+        entry_id = service.data.get(ATTR_CONFIG_ENTRY_ID)
+
+        # Without a config entry id, every controller switches mode
+        await asyncio.gather(
+            *[
+                data.set_home_mode(home_mode, come_back_time)
+                for data in hass.data[DOMAIN].values()
+                if entry_id in (None, data.entry_id)
+            ]
+        )
+
+    def split_by_controller(values, entry_id, attr):
+        """
+        Split the values of a bulk service between the controllers knowing their item
+        :param values: dict of item id to value
+        :param attr: snapshot attribute indexing the items
+        :return: list of (controller handle, dict of item id to value)
+        """
+        batches = []
+        unknown = set(values)
+        for data in hass.data[DOMAIN].values():
+            if entry_id not in (None, data.entry_id) or data.snapshot is None:
+                continue
+            items = getattr(data.snapshot, attr)
+            batch = {item_id: value for item_id, value in values.items() if item_id in items}
+            unknown -= batch.keys()
+            if batch:
+                batches.append((data, batch))
+        if unknown:
+            _LOGGER.error(
+                "No Wiser Smart {} found for {}".format(attr, ", ".join(sorted(unknown)))
+            )
+        return batches
+
+    async def set_room_temperatures(service):
+        # One request and one refresh per controller
+        await asyncio.gather(
+            *[
+                data.set_room_temperatures(temperatures)
+                for data, temperatures in split_by_controller(
+                    service.data[ATTR_TEMPERATURES],
+                    service.data.get(ATTR_CONFIG_ENTRY_ID),
+                    "rooms",
+                )
+            ]
+        )
+
+    async def set_appliance_states(service):
+        await asyncio.gather(
+            *[
+                data.set_appliance_states(states)
+                for data, states in split_by_controller(
+                    service.data[ATTR_STATES],
+                    service.data.get(ATTR_CONFIG_ENTRY_ID),
+                    "appliances",
+                )
+            ]
+        )
+
+    async def dump_command_latencies(service):
+        entry_id = service.data.get(ATTR_CONFIG_ENTRY_ID)
+        for data in hass.data[DOMAIN].values():
+            if entry_id not in (None, data.entry_id):
+                continue
+            latencies = data.tracer.as_dict()
+            _LOGGER.info(
+                "Wiser Smart command latencies for {}: {}".format(
+                    data.unique_id, latencies
+                )
+            )
+            hass.bus.async_fire(
+                EVENT_COMMAND_LATENCIES,
+                {"config_entry_id": data.entry_id, **latencies},
+            )
+
+    """ Register Services """
+    hass.services.async_register(
+        DOMAIN,
+        WISER_SMART_SERVICES["SERVICE_SET_APPLIANCE_STATE"],
+        set_appliance_state,
+        schema=SET_APPLIANCE_MODE_SCHEMA,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        WISER_SMART_SERVICES["SERVICE_SET_HOME_MODE"],
+        set_home_mode,
+        schema=SET_HOME_MODE_SCHEMA,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        WISER_SMART_SERVICES["SERVICE_DUMP_COMMAND_LATENCIES"],
+        dump_command_latencies,
+        schema=DUMP_COMMAND_LATENCIES_SCHEMA,
     )
+    hass.services.async_register(
+        DOMAIN,
+        WISER_SMART_SERVICES["SERVICE_SET_ROOM_TEMPERATURES"],
+        set_room_temperatures,
+        schema=SET_ROOM_TEMPERATURES_SCHEMA,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        WISER_SMART_SERVICES["SERVICE_SET_APPLIANCE_STATES"],
+        set_appliance_states,
+        schema=SET_APPLIANCE_STATES_SCHEMA,
+    )
+
+
+async def async_setup_entry(hass, config_entry):
+    """Set up the Wiser Smart component."""
+    hass.data.setdefault(DOMAIN, {})
 
     _LOGGER.info(
         "Wiser Smart setup with Controller IP =  {} and scan interval of {} seconds".format(
-            config_entry.data[CONF_HOST], SCAN_INTERVAL
+            config_entry.data[CONF_HOST],
+            config_entry.data.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL),
         )
     )
-    config_entry.add_update_listener(config_update_listener)
 
+    # Controllers set up together poll with an offset from each other
     data = WiserSmartControllerHandle(
         hass,
         config_entry,
         config_entry.data[CONF_HOST],
         config_entry.data[CONF_USERNAME],
         config_entry.data[CONF_PASSWORD],
+        phase=len(hass.data[DOMAIN]) * POLL_STAGGER,
+    )
+    hass.data[DOMAIN][config_entry.entry_id] = data
+    config_entry.async_on_unload(
+        config_entry.add_update_listener(data.async_config_updated)
     )
 
     await data.async_connect()
 
-    @callback
-    def retryWiserSmartControllerSetup():
-        hass.async_create_task(wiserSmartControllerSetup())
+    if await data.async_load_cache():
+        # Entities are created from the last known data right away and
+        # reconciled when the controller answers, HA boot does not wait for it
+        _LOGGER.info("Wiser Smart setup from cached data, refreshing in the background")
+        hass.async_create_task(data.async_update(no_throttle=True))
+    elif not await data.async_update():
+        await hass.data[DOMAIN].pop(config_entry.entry_id).async_shutdown()
+        # Home Assistant retries the setup with its own backoff
+        raise ConfigEntryNotReady("Unable to connect to the Wiser Controller")
+    elif not data.snapshot.devices:
+        _LOGGER.error("No Wiser devices found to set up")
+        await hass.data[DOMAIN].pop(config_entry.entry_id).async_shutdown()
+        return False
 
-    async def wiserSmartControllerSetup():
-        _LOGGER.info("Initiating wiserSmart Controller connection")
-        try:
-            if await data.async_connect():
-                if await data.async_update():
-                    if data.wiserSmart.getWiserDevices is None:
-                        _LOGGER.error("No Wiser devices found to set up")
-                        return False
-
-                    hass.data[DOMAIN] = data
-
-                    for platform in WISER_SMART_PLATFORMS:
-                        hass.async_create_task(
-                            hass.config_entries.async_forward_entry_setup(
-                                config_entry, platform
-                            )
-                        )
+    await data.async_update_device_registry()
+    await asyncio.gather(
+        *[
+            hass.config_entries.async_forward_entry_setup(config_entry, platform)
+            for platform in WISER_SMART_PLATFORMS
+        ]
+    )
+    _LOGGER.info("Wiser Smart Component Setup Completed")
+    return True
 
-                    _LOGGER.info("Wiser Smart Component Setup Completed")
-                    await data.async_update_device_registry()
-                    return True
-                else:
-                    await scheduleWiserSmartSetup()
-                    return True
-        except (asyncio.TimeoutError):
-            await scheduleWiserSmartSetup()
-            return True
-        except WiserControllerTimeoutException:
-            await scheduleWiserSmartSetup()
-            return True
-        except Exception:
-            await scheduleWiserSmartSetup()
-            return True
 
-    async def scheduleWiserSmartSetup(interval=300):
-        _LOGGER.error(
-            "Unable to connect to the Wiser Controller, retrying in {} seconds".format(
-                interval
-            )
+async def async_migrate_entry(hass, config_entry):
+    """Migrate the registry entries of an old config entry."""
+    if config_entry.version == 1:
+        name = config_entry.data[CONF_NAME]
+        # Rooms, devices and appliances were identified by their name only.
+        # The first entry keeps these ids, the others add their controller
+        # name so that items named alike on two controllers no longer collide
+        legacy = not any(
+            entry.data.get(CONF_LEGACY_UNIQUE_IDS)
+            for entry in hass.config_entries.async_entries(DOMAIN)
+        )
+        config_entry.version = 2
+        hass.config_entries.async_update_entry(
+            config_entry, data={**config_entry.data, CONF_LEGACY_UNIQUE_IDS: legacy}
         )
-        hass.loop.call_later(interval, retryWiserSmartControllerSetup)
-        return
 
-    await wiserSmartControllerSetup()
+        @callback
+        def migrate_unique_ids(entity_entry):
+            """Controller sensors used to share one unique id across controllers"""
+            for sensor_type in ["Cloud Sensor", "Operation Mode"]:
+                if entity_entry.unique_id == "{}-0".format(sensor_type):
+                    return {"new_unique_id": "{}-{}".format(sensor_type, name)}
+            # Controller sensors already holding the controller name
+            if legacy or entity_entry.unique_id.endswith("-{}".format(name)):
+                return None
+            return {"new_unique_id": controller_unique_id(entity_entry.unique_id, name)}
+
+        await entity_registry.async_migrate_entries(
+            hass, config_entry.entry_id, migrate_unique_ids
+        )
+
+        if not legacy:
+            registry = await hass.helpers.device_registry.async_get_registry()
+            for device in device_registry.async_entries_for_config_entry(
+                registry, config_entry.entry_id
+            ):
+                if device.identifiers == {(DOMAIN, name)}:
+                    continue
+                if device.config_entries == {config_entry.entry_id}:
+                    registry.async_update_device(
+                        device.id,
+                        new_identifiers={
+                            (domain, controller_unique_id(identifier, name))
+                            for domain, identifier in device.identifiers
+                        },
+                    )
+                else:
+                    # Room merged with the room of the same name of another
+                    # controller, the entities of this one get their own device
+                    registry.async_update_device(
+                        device.id, remove_config_entry_id=config_entry.entry_id
+                    )
+
+        _LOGGER.info(
+            "Wiser Smart entry {} migrated to version 2".format(config_entry.title)
+        )
     return True
 
 
+async def async_remove_entry(hass, config_entry):
+    """Remove the cached controller data of a deleted entry."""
+    await Store(
+        hass, STORAGE_VERSION, STORAGE_KEY.format(config_entry.entry_id)
+    ).async_remove()
+
+
 async def async_unload_entry(hass, config_entry):
     """Unload a config entry."""
 
-    # Deregister services
-    _LOGGER.debug("Unregister Wiser Smart Services")
-    for service in WISER_SMART_SERVICES:
-        hass.services.async_remove(DOMAIN, WISER_SMART_SERVICES[service])
-
     _LOGGER.debug("Unloading Wiser Smart Component")
     tasks = []
     for platform in WISER_SMART_PLATFORMS:
@@ -185,72 +487,310 @@ async def async_unload_entry(hass, config_entry):
 
     unload_status = all(await asyncio.gather(*tasks))
     if unload_status:
-        hass.data.pop(DOMAIN)
+        data = hass.data[DOMAIN].pop(config_entry.entry_id)
+        await data.async_shutdown()
     return unload_status
 
 
-async def config_update_listener(hass, config_entry):
-    """Handle config update update."""
-    global SCAN_INTERVAL
-
-    SCAN_INTERVAL = int(config_entry.data.get(CONF_SCAN_INTERVAL))
-    _LOGGER.info(
-        "Wiser config parameters changed, scan interval = {}".format(
-            SCAN_INTERVAL,
-        )
-    )
-
-
 class WiserSmartControllerHandle:
-    def __init__(self, hass, config_entry, ip, user, password):
+    def __init__(self, hass, config_entry, ip, user, password, phase=0):
         self._hass = hass
         self._config_entry = config_entry
         self._name = config_entry.data[CONF_NAME]
+        # Controller name added to the ids of rooms, devices and appliances,
+        # None for the entry keeping the ids it had before several controllers
+        self.id_controller = (
+            None if config_entry.data.get(CONF_LEGACY_UNIQUE_IDS) else self._name
+        )
         self.ip = ip
         self.user = user
         self.password = password
-        self.wiserSmart = None
+        self.client = None
+        self.snapshot = None
+        self._topology = None
+        # Appliance entities by entity id, maintained as they are added and removed
+        self.appliance_entities = {}
         self.minimum_temp = TEMP_MINIMUM
         self.maximum_temp = TEMP_MAXIMUM
-        self.timer_handle = None
+        # One poll scheduler per refresh tier, each fetching only its sections
+        self.schedulers = {
+            tier: WiserSmartPollScheduler(
+                hass,
+                partial(self.async_update, sections=TIER_SECTIONS[tier]),
+                interval,
+                phase=phase,
+            )
+            for tier, interval in self._tier_intervals(config_entry).items()
+        }
+        self.health = WiserSmartConnectionHealth()
+        self.stats = WiserSmartPollStats()
+        self.tracer = WiserSmartCommandTracer()
+        self.deadbands = self._deadbands(config_entry)
+        # Entity state writes done and skipped as within their deadbands
+        self.state_writes = {"written": 0, "suppressed": 0}
+        # Sections of the snapshot loaded from the cache that no poll has
+        # fetched from the controller yet
+        self.stale_sections = frozenset()
+        self._shut_down = False
+        self._store = Store(
+            hass, STORAGE_VERSION, STORAGE_KEY.format(config_entry.entry_id)
+        )
+        # A delayed save restarts its timer when called again, only schedule
+        # one at a time or polls faster than the delay would never save
+        self._cache_save_pending = False
+        self._refresh_task = None
+        self._pending_sections = set()
+        self._refreshing_sections = set()
+        # Confirmation read after commands, shared by commands close together
+        self._unsub_confirm = None
+        self._unconfirmed = set()
+        # Generation of the last update of items newer than the polls, a
+        # refresh started before an item was updated must not overwrite it
+        self._generation = 0
+        self._item_generations = {}
+        self._commands = WiserSmartCommandQueue(hass, self.async_write_commands)
 
     async def async_connect(self):
-        self.wiserSmart = await self._hass.async_add_executor_job(
-            partial(wiserSmart, self.ip, self.user, self.password)
+        self.client = WiserSmartClient(
+            async_get_clientsession(self._hass), self.ip, self.user, self.password
+        )
+        return True
+
+    @property
+    def optimistic(self):
+        return self._config_entry.data.get(
+            CONF_OPTIMISTIC_UPDATES, DEFAULT_OPTIMISTIC_UPDATES
+        )
+
+    @property
+    def confirm_delay(self):
+        return self._config_entry.data.get(CONF_CONFIRM_DELAY, DEFAULT_CONFIRM_DELAY)
+
+    @property
+    def state_max_age(self):
+        return self._config_entry.data.get(CONF_STATE_MAX_AGE, DEFAULT_STATE_MAX_AGE)
+
+    @staticmethod
+    def _deadbands(config_entry):
+        return {
+            DEADBAND_TEMPERATURE: Deadband(
+                config_entry.data.get(
+                    CONF_TEMPERATURE_DEADBAND, DEFAULT_TEMPERATURE_DEADBAND
+                )
+            ),
+            DEADBAND_POWER: Deadband(
+                config_entry.data.get(CONF_POWER_DEADBAND, DEFAULT_POWER_DEADBAND),
+                config_entry.data.get(
+                    CONF_POWER_DEADBAND_PERCENT, DEFAULT_POWER_DEADBAND_PERCENT
+                ),
+            ),
+        }
+
+    @staticmethod
+    def _tier_intervals(config_entry):
+        return {
+            TIER_APPLIANCES: int(
+                config_entry.data.get(
+                    CONF_POWER_SCAN_INTERVAL, DEFAULT_POWER_SCAN_INTERVAL
+                )
+            ),
+            TIER_ROOMS: int(
+                config_entry.data.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)
+            ),
+            TIER_DEVICES: int(
+                config_entry.data.get(
+                    CONF_DEVICE_SCAN_INTERVAL, DEFAULT_DEVICE_SCAN_INTERVAL
+                )
+            ),
+        }
+
+    async def async_config_updated(self, hass, config_entry):
+        """Handle config update update."""
+        for tier, interval in self._tier_intervals(config_entry).items():
+            self.schedulers[tier].base_interval = interval
+            self.schedulers[tier].async_schedule()
+        self.deadbands = self._deadbands(config_entry)
+        _LOGGER.info(
+            "Wiser config parameters changed, scan interval = {}".format(
+                self.schedulers[TIER_ROOMS].base_interval,
+            )
         )
+
+    async def async_load_cache(self):
+        """
+        Load the snapshot saved by a previous run
+        :return: True if a usable snapshot was loaded
+        """
+        try:
+            cache = await self._store.async_load()
+        except NotImplementedError:
+            # Cache of an older version, rebuilt after the first refresh
+            return False
+        if not cache:
+            return False
+        try:
+            self.snapshot = WiserSmartSnapshot.from_cache(cache)
+        except (KeyError, TypeError, AttributeError) as ex:
+            _LOGGER.warning("Ignoring invalid Wiser Smart cache")
+            _LOGGER.debug("Error is {}".format(ex))
+            return False
+        if not self.snapshot.devices:
+            return False
+        self.stale_sections = ALL_SECTIONS
         return True
 
+    def is_stale(self, sections):
+        """Return whether some of the sections still hold cached data only"""
+        return not self.stale_sections.isdisjoint(sections)
+
     @callback
-    def do_controller_update(self):
-        self._hass.async_create_task(self.async_update())
+    def _cache_data(self):
+        self._cache_save_pending = False
+        return self.snapshot.to_cache()
 
-    async def async_update(self, no_throttle: bool = False):
-        # Update uses event loop scheduler for scan interval
+    async def async_shutdown(self):
+        """Cancel scheduled updates when the entry is unloaded"""
+        # A refresh finishing after this must not save the cache again
+        self._shut_down = True
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        for scheduler in self.schedulers.values():
+            scheduler.async_stop()
+        if self._unsub_confirm is not None:
+            self._unsub_confirm()
+            self._unsub_confirm = None
+        self._commands.async_cancel()
+        if self._cache_save_pending:
+            # Saving now cancels the delayed save, which would otherwise
+            # write the cache again after the entry is removed
+            await self._store.async_save(self._cache_data())
+
+    async def async_update(self, no_throttle: bool = False, sections=ALL_SECTIONS):
+        """
+        Refresh data from the controller
+        :param no_throttle: forced update, do not reuse a refresh already running
+        :param sections: the controller data sections to fetch, all by default
+        """
+        # Update uses the poll schedulers for scan interval, the next poll of
+        # a tier is scheduled once the refresh covering it completes
         if no_throttle:
             # Forced update
             _LOGGER.info("Update of Wiser Smart data requested via On Demand")
-            # Cancel next scheduled update and schedule for next interval
-            if self.timer_handle:
-                self.timer_handle.cancel()
         else:
             # Updated on schedule
-            _LOGGER.info(
-                "Update of Wiser Smart data requested on {} seconds interval".format(
-                    SCAN_INTERVAL
+            _LOGGER.debug(
+                "Update of Wiser Smart {} data requested on schedule".format(
+                    ", ".join(sorted(sections))
                 )
             )
-        # Schedule next update
-        self.timer_handle = self._hass.loop.call_later(
-            SCAN_INTERVAL, self.do_controller_update
-        )
 
+        # Only one refresh runs at a time, callers join the one in progress.
+        # A caller needing sections the running refresh does not fetch, or a
+        # forced update that may follow a write the running refresh has not
+        # seen, queues one more refresh shared by all of them.
+        if self._refresh_task is None:
+            self._pending_sections = set(sections)
+            self._refresh_task = self._hass.async_create_task(self._async_refresh_loop())
+        elif no_throttle or not set(sections) <= self._refreshing_sections:
+            self._pending_sections.update(sections)
+        return await asyncio.shield(self._refresh_task)
+
+    async def _async_refresh_loop(self):
+        start = monotonic()
+        refreshed = set()
+        result = False
+        try:
+            while self._pending_sections:
+                if not self.health.allow_request():
+                    _LOGGER.debug(
+                        "Wiser Smart circuit open, skipping poll for {:.0f} seconds".format(
+                            self.health.retry_in
+                        )
+                    )
+                    self.stats.record_failure(self._pending_sections, 0, OUTCOME_SKIPPED)
+                    refreshed.update(self._pending_sections)
+                    self._pending_sections = set()
+                    break
+                self._refreshing_sections = self._pending_sections
+                self._pending_sections = set()
+                result = await self._async_refresh(self._refreshing_sections)
+                refreshed.update(self._refreshing_sections)
+                if self._pending_sections:
+                    _LOGGER.debug("Wiser Smart refresh requested during refresh, refreshing again")
+            return result
+        finally:
+            self._refresh_task = None
+            self._refreshing_sections = set()
+            duration = monotonic() - start
+            # While the circuit is open the next poll is the half-open probe
+            delay = self.health.retry_in or None
+            for tier, scheduler in self.schedulers.items():
+                if TIER_SECTIONS[tier] <= refreshed:
+                    scheduler.async_poll_completed(duration, delay)
+
+    async def _async_refresh(self, sections):
+        start = monotonic()
+        result = await self._async_fetch(sections)
+        if result:
+            self.health.record_success()
+        else:
+            self.health.record_failure()
+            self.stats.record_failure(sections, monotonic() - start)
+        return result
+
+    async def _async_fetch(self, sections):
         try:
             # Update from Wiser Controller
-            result = await self._hass.async_add_executor_job(self.wiserSmart.refreshData)
+            start = monotonic()
+            # Measures of this fetch only, read backs may run alongside it
+            transfer = WiserSmartTransfer()
+            generation = self._generation
+            result = await self.client.async_get_data(
+                sections, SECTION_PARSERS, transfer
+            )
+            fetched = monotonic()
             if result is not None:
-                _LOGGER.info("Wiser Smart data updated")
-                # Send update notice to all components to update
-                dispatcher_send(self._hass, "WiserSmartUpdateMessage")
+                _LOGGER.debug("Wiser Smart data updated")
+                # Index the new data once, entities only read from the snapshot
+                snapshot = WiserSmartSnapshot.from_data(result, self.snapshot)
+                newer = self._items_updated_since(generation)
+                if newer:
+                    # Read back or written while this poll was running
+                    snapshot = snapshot.keep_items(self.snapshot, newer)
+                revived = self.stale_sections & result.keys()
+                if revived:
+                    # Entities of these sections have to become available again
+                    self.stale_sections = self.stale_sections - revived
+                    changed = snapshot.diff(None)
+                else:
+                    changed = snapshot.diff(self.snapshot)
+                if (
+                    self.snapshot is not None
+                    and snapshot.heating_rooms() != self.snapshot.heating_rooms()
+                ):
+                    self.schedulers[TIER_ROOMS].async_speed_up(
+                        "a room started or stopped heating"
+                    )
+                self.snapshot = snapshot
+                if not self._cache_save_pending and not self._shut_down:
+                    self._cache_save_pending = True
+                    self._store.async_delay_save(self._cache_data, CACHE_SAVE_DELAY)
+                indexed = monotonic()
+                notified = self._async_notify(changed)
+                done = monotonic()
+                parse_time = transfer.parse_time
+                self._async_record_poll(
+                    sections,
+                    {
+                        STAT_TOTAL: done - start,
+                        STAT_RESPONSE: fetched - start - parse_time,
+                        STAT_PARSE: parse_time,
+                        STAT_SNAPSHOT: indexed - fetched,
+                        STAT_SIGNAL: done - indexed,
+                        STAT_PAYLOAD: transfer.bytes_received,
+                        STAT_NOTIFIED: notified,
+                    },
+                )
                 return True
             else:
                 _LOGGER.error("Unable to update from Wiser Controller")
@@ -267,6 +807,11 @@ class WiserSmartControllerHandle:
             )
             _LOGGER.debug("Error is {}".format(ex))
             return False
+        except WiserControllerDataInvalid as ex:
+            _LOGGER.error(
+                "Invalid data received from the Wiser Controller: {}".format(ex)
+            )
+            return False
         except Exception as ex:
             _LOGGER.error(
                 "Failed to get update from Wiser Smart due to unknown error"
@@ -274,10 +819,206 @@ class WiserSmartControllerHandle:
             _LOGGER.debug("Error is {}".format(ex))
             return False
 
+    async def _async_confirm_update(self, _now=None):
+        # Commands applied during this read back schedule their own
+        self._unsub_confirm = None
+        items, self._unconfirmed = self._unconfirmed, set()
+        await self.async_refresh_items(items)
+
+    async def async_refresh_room(self, room_id):
+        """Read back one room from the controller"""
+        return await self._async_refresh_items(KIND_ROOM, [room_id])
+
+    async def async_refresh_appliance(self, applianceName):
+        """Read back one appliance from the controller"""
+        return await self._async_refresh_items(KIND_APPLIANCE, [applianceName])
+
+    async def async_refresh_items(self, items):
+        """
+        Read back only some items from the controller
+        :param items: iterable of (kind, item_id)
+        """
+        by_kind = {}
+        for kind, item_id in items:
+            by_kind.setdefault(kind, []).append(item_id)
+        kinds = [kind for kind in by_kind if kind != KIND_CONTROLLER]
+        refreshes = [self._async_refresh_items(kind, by_kind[kind]) for kind in kinds]
+        if KIND_CONTROLLER in by_kind:
+            kinds.append(KIND_CONTROLLER)
+            refreshes.append(
+                self.async_update(no_throttle=True, sections=[SECTION_HOME_MODE])
+            )
+        results = await asyncio.gather(*refreshes)
+        for kind, result in zip(kinds, results):
+            kind_items = [(kind, item_id) for item_id in by_kind[kind]]
+            if result:
+                self.tracer.async_confirmed(kind_items)
+            else:
+                self.tracer.async_failed(kind_items, "unconfirmed")
+        return all(results)
+
+    async def _async_refresh_items(self, kind, item_ids):
+        # The controller has no per item endpoint, fetch only the section
+        # holding the items and only take these items from it
+        if not self.health.allow_request():
+            _LOGGER.debug("Wiser Smart circuit open, skipping read back")
+            return False
+        generation = self._generation
+        try:
+            data = await self.client.async_get_data([KIND_SECTIONS[kind]], SECTION_PARSERS)
+        except Exception as ex:
+            self.health.record_failure()
+            _LOGGER.error(
+                "Failed to read back Wiser Smart {} {}".format(kind, ", ".join(item_ids))
+            )
+            _LOGGER.debug("Error is {}".format(ex))
+            return False
+        self.health.record_success()
+        # Items updated by a later read back or write are already newer
+        newer = self._items_updated_since(generation)
+        item_ids = [item_id for item_id in item_ids if (kind, item_id) not in newer]
+        snapshot = self.snapshot.merge_items(data, kind, item_ids)
+        changed = snapshot.diff(self.snapshot)
+        self.snapshot = snapshot
+        self._async_items_updated((kind, item_id) for item_id in item_ids)
+        self._async_notify(changed)
+        return True
+
+    @callback
+    def _async_items_updated(self, items):
+        """Record items updated outside of a poll, after every refresh already running"""
+        self._generation += 1
+        for item in items:
+            self._item_generations[item] = self._generation
+
+    def _items_updated_since(self, generation):
+        """Return the (kind, item_id) updated after the given generation"""
+        return {
+            item
+            for item, item_generation in self._item_generations.items()
+            if item_generation > generation
+        }
+
+    @callback
+    def _async_notify(self, changed):
+        """
+        Only notify the entities whose data changed
+        :param changed: list of (kind, item_id)
+        :return: the number of entities notified
+        """
+        _LOGGER.debug("{} Wiser Smart items changed".format(len(changed)))
+        listeners = self._hass.data.get(DATA_DISPATCHER, {})
+        notified = 0
+        for kind, item_id in changed:
+            signal = update_signal(self.entry_id, kind, item_id)
+            notified += len(listeners.get(signal, ()))
+            async_dispatcher_send(self._hass, signal)
+        return notified
+
+    @property
+    def poll_budget(self):
+        return self._config_entry.data.get(CONF_POLL_BUDGET, DEFAULT_POLL_BUDGET)
+
+    @callback
+    def _async_record_poll(self, sections, measures):
+        """Record the measures of one poll and report polls over budget"""
+        self.stats.record(measures, sections)
+        _LOGGER.debug(
+            "Wiser Smart poll of {}: {}".format(", ".join(sorted(sections)), measures)
+        )
+        if measures[STAT_TOTAL] > self.poll_budget:
+            self._hass.bus.async_fire(
+                EVENT_POLL_OVER_BUDGET,
+                {
+                    "config_entry_id": self.entry_id,
+                    "sections": sorted(sections),
+                    "budget": self.poll_budget,
+                    **measures,
+                },
+            )
+        async_dispatcher_send(self._hass, update_signal(self.entry_id, KIND_POLL_STATS))
+
+    async def async_write_commands(self, commands):
+        """
+        Send a batch of queued commands, one request per kind of command
+        :param commands: dict of (kind, item_id) to the value to write
+        """
+        rooms = {}
+        appliances = {}
+        changes = []
+        writes = []
+        for (kind, item_id), value in commands.items():
+            if kind == KIND_ROOM:
+                rooms[item_id] = value
+                changes.append(
+                    (kind, item_id, {"target_temperature": clamp_temperature(value)})
+                )
+            elif kind == KIND_APPLIANCE:
+                appliance_id = self.snapshot.appliance(item_id).appliance_id
+                appliances[appliance_id] = value
+                changes.append((kind, item_id, {"state": value}))
+            elif kind == KIND_CONTROLLER:
+                hcMode, mode, come_back_time = value
+                writes.append(self.client.async_set_home_mode(hcMode, mode, come_back_time))
+                changes.append((kind, None, {"home_mode": mode}))
+        if rooms:
+            writes.append(self.client.async_set_room_temps(rooms))
+        if appliances:
+            writes.append(self.client.async_set_appliance_states(appliances))
+
+        try:
+            await asyncio.gather(*writes)
+        except Exception:
+            self.tracer.async_failed(commands)
+            raise
+        self.tracer.async_written(commands)
+        self.schedulers[TIER_ROOMS].async_speed_up("a command")
+        await self.async_after_commands(changes)
+
+    async def async_after_commands(self, changes):
+        """
+        Reflect successful commands in the entities
+        In optimistic mode the written values are applied to the snapshot and
+        only the affected entities are notified straight away, the written
+        items are read back after the confirmation delay. Otherwise they are
+        read back immediately, once for the whole batch.
+        :param changes: list of (kind, item_id, dict of written values)
+        """
+        items = {(kind, item_id) for kind, item_id, values in changes}
+        # A poll started before the write must not show the previous values
+        self._async_items_updated(items)
+        if not self.optimistic or self.snapshot is None:
+            await self.async_refresh_items(items)
+            return
+
+        snapshot = self.snapshot
+        for kind, item_id, values in changes:
+            snapshot = snapshot.patch(kind, item_id, **values)
+        self.snapshot = snapshot
+        self._async_notify(list(items))
+        self._unconfirmed.update(items)
+        if self._unsub_confirm is None:
+            self._unsub_confirm = async_call_later(
+                self._hass, self.confirm_delay, self._async_confirm_update
+            )
+
     @property
     def unique_id(self):
         return self._name
 
+    @property
+    def topology(self):
+        """Device topology, rebuilt only when the device list changes"""
+        if self._topology is None or self._topology.devices is not self.snapshot.devices:
+            self._topology = WiserSmartTopology(
+                self.snapshot.devices, self.id_controller
+            )
+        return self._topology
+
+    @property
+    def entry_id(self):
+        return self._config_entry.entry_id
+
     async def async_update_device_registry(self):
         """Update device registry."""
         device_registry = await self._hass.helpers.device_registry.async_get_registry()
@@ -291,18 +1032,19 @@ class WiserSmartControllerHandle:
 
     async def set_home_mode(self, mode, come_back_time):
         hcMode = "manual" if mode in ["manual"] else "schedule"
-        if self.wiserSmart is None:
-            self.wiserSmart = await self.async_connect()
+        if self.client is None:
+            await self.async_connect()
         _LOGGER.debug(
             "Setting home mode to {}.".format(mode)
         )
+        self.tracer.async_start("set_home_mode", KIND_CONTROLLER, None)
         try:
-            await self._hass.async_add_executor_job(
-                partial(self.wiserSmart.setWiserHomeMode, hcMode, mode, come_back_time)
+            await self._commands.async_send(
+                KIND_CONTROLLER, None, (hcMode, mode, come_back_time)
             )
-            await self.async_update(no_throttle=True)
-        except BaseException as e:
-            _LOGGER.debug("Error setting home mode! {}".format(str(e)))
+        except WiserError as e:
+            _LOGGER.error("Error setting home mode to {}, error {}".format(mode, str(e)))
+            raise HomeAssistantError("Error setting Wiser Smart home mode") from e
 
     async def set_appliance_state(self, applianceName, state):
         """
@@ -311,20 +1053,79 @@ class WiserSmartControllerHandle:
         :param state: Can be True or False
         :return:
         """
-        if self.wiserSmart is None:
-            self.wiserSmart = await self.async_connect()
+        if self.client is None:
+            await self.async_connect()
         _LOGGER.info("Setting appliance {} to {} ".format(applianceName, state))
 
+        self.tracer.async_start("set_appliance_state", KIND_APPLIANCE, applianceName)
         try:
-            await self._hass.async_add_executor_job(
-                partial(self.wiserSmart.setWiserApplianceState, applianceName, state)
-            )
-            await self.async_update(no_throttle=True)
+            await self._commands.async_send(KIND_APPLIANCE, applianceName, state)
 
-        except BaseException as e:
-            _LOGGER.debug(
+        except WiserError as e:
+            _LOGGER.error(
                 "Error setting Appliance {} to {}, error {}".format(
                     applianceName, state, str(e)
                 )
             )
+            raise HomeAssistantError(
+                "Error setting Wiser Smart appliance {}".format(applianceName)
+            ) from e
+
+    async def set_appliance_states(self, states):
+        """
+        Set the state of several smart plugs in one request
+        :param states: dict of appliance name to state
+        """
+        await self._async_send_many("set_appliance_state", KIND_APPLIANCE, states)
+
+    async def set_room_temperatures(self, temperatures):
+        """
+        Set the target temperature of several rooms in one request
+        :param temperatures: dict of room name to temperature in degrees celsius
+        """
+        await self._async_send_many("set_room_temperature", KIND_ROOM, temperatures)
 
+    async def _async_send_many(self, command, kind, values):
+        if self.client is None:
+            await self.async_connect()
+        _LOGGER.debug("Sending {} {} commands".format(len(values), command))
+
+        for item_id in values:
+            self.tracer.async_start(command, kind, item_id)
+        try:
+            await self._commands.async_send_many(
+                {(kind, item_id): value for item_id, value in values.items()}
+            )
+
+        except WiserError as e:
+            _LOGGER.error(
+                "Error sending {} {} commands, error {}".format(len(values), command, str(e))
+            )
+            raise HomeAssistantError(
+                "Error sending {} Wiser Smart {} commands".format(len(values), command)
+            ) from e
+
+    async def set_room_temperature(self, roomName, temperature):
+        """
+        Set the target temperature of a room
+        :param roomName:
+        :param temperature: target temperature in degrees celsius
+        :return:
+        """
+        if self.client is None:
+            await self.async_connect()
+        _LOGGER.debug("Setting temperature for {} to {}".format(roomName, temperature))
+
+        self.tracer.async_start("set_room_temperature", KIND_ROOM, roomName)
+        try:
+            await self._commands.async_send(KIND_ROOM, roomName, temperature)
+
+        except WiserError as e:
+            _LOGGER.error(
+                "Error setting room {} to {}, error {}".format(
+                    roomName, temperature, str(e)
+                )
+            )
+            raise HomeAssistantError(
+                "Error setting Wiser Smart room {} temperature".format(roomName)
+            ) from e
@@ -0,0 +1,295 @@
+"""
+Asynchronous client for the Wiser Smart Controller RPC API
+
+Talks to the same endpoints as wiserSmartAPI.wiserSmart but runs on Home
+Assistant's shared aiohttp session, so no executor thread is held for the
+duration of a request and connections are kept alive between polls.
+
+https://github.com/tomtomfx/wiserSmartForHA
+thomas.fayoux@gmail.com
+
+"""
+import asyncio
+import json
+from time import monotonic
+
+import aiohttp
+
+from .const import _LOGGER
+from .stream import JSONItemStream
+
+"""
+Wiser Smart RPC URLS
+"""
+WISERSMARTDEVICELIST = "http://{}/rpc/homedevice/device_list"
+WISERSMARTAPPLIANCELIST = "http://{}/rpc/loadmanagement/get_appliances"
+WISERSMARTGETMODE = "http://{}/rpc/mode/get_home_mode"
+WISERSMARTTEMPLIST = "http://{}/rpc/hvac/get_all_loc_temp"
+WISERSMARTSETAPPLIANCESTATE = "http://{}/rpc/loadmanagement/set_appliance_state"
+WISERSMARTSETMODE = "http://{}/rpc/mode/set_home_mode"
+WISERSMARTSETTEMP = "http://{}/rpc/hvac/set_loc_temp"
+WISERSMARTSYSTEM = "http://{}/rpc/diagnostic/get_properties"
+
+SYSTEM_PROPERTIES = ["ehc.gw.host.name", "ehc.wcs2.cloud.status", "ehc.version.macaddress"]
+
+"""
+Temperatures boundaries
+"""
+TEMP_MINIMUM = 0.5
+TEMP_MAXIMUM = 35
+
+TIMEOUT = 5
+# Size of the response chunks parsed while streaming
+STREAM_CHUNK_SIZE = 16384
+# The controller is a small embedded device, do not flood it
+MAX_CONNECTIONS = 2
+
+"""
+Data sections returned by a refresh
+"""
+SECTION_SYSTEM = "system"
+SECTION_HOME_MODE = "home_mode"
+SECTION_DEVICES = "devices"
+SECTION_TEMPERATURES = "temperatures"
+SECTION_APPLIANCES = "appliances"
+ALL_SECTIONS = frozenset(
+    [SECTION_SYSTEM, SECTION_HOME_MODE, SECTION_DEVICES, SECTION_TEMPERATURES, SECTION_APPLIANCES]
+)
+
+_SECTION_URLS = {
+    SECTION_HOME_MODE: WISERSMARTGETMODE,
+    SECTION_DEVICES: WISERSMARTDEVICELIST,
+    SECTION_TEMPERATURES: WISERSMARTTEMPLIST,
+    SECTION_APPLIANCES: WISERSMARTAPPLIANCELIST,
+}
+
+
+"""
+Exception Handlers
+"""
+class Error(Exception):
+    """Base class for exceptions in this module."""
+    pass
+
+class WiserControllerNotFound(Error):
+    pass
+
+class WiserRESTException(Error):
+    pass
+
+class WiserControllerDataNull(Error):
+    pass
+
+class WiserControllerDataInvalid(Error):
+    pass
+
+class WiserControllerAuthenticationException(Error):
+    pass
+
+class WiserControllerTimeoutException(Error):
+    pass
+
+
+def clamp_temperature(temp):
+    """Bring a target temperature within the controller boundaries"""
+    return min(max(temp, TEMP_MINIMUM), TEMP_MAXIMUM)
+
+
+def get_system_property(system, name):
+    """Return the value of a property from the controller diagnostic data"""
+    for prop in (system or {}).get("propertyDetails") or []:
+        if prop.get("name") == name:
+            return prop.get("value")
+    return None
+
+
+class WiserSmartTransfer:
+    """Bytes received and time spent parsing by the requests of one fetch"""
+
+    __slots__ = ("bytes_received", "parse_time")
+
+    def __init__(self):
+        self.bytes_received = 0
+        self.parse_time = 0
+
+
+class WiserSmartClient:
+    """Wiser Smart Controller client using a shared aiohttp session"""
+
+    def __init__(self, session, host, user, password, max_connections=MAX_CONNECTIONS):
+        self._session = session
+        self._host = host
+        self._auth = aiohttp.BasicAuth(user, password)
+        self._timeout = aiohttp.ClientTimeout(total=TIMEOUT)
+        # Per controller limit, the shared session connector is not ours to size
+        self._semaphore = asyncio.Semaphore(max_connections)
+
+    async def _post(self, url, jsonData, transfer=None):
+        """
+        Generic function to send a POST request to the Wiser Controller
+        :param transfer: WiserSmartTransfer the request is measured into
+        """
+        if transfer is None:
+            transfer = WiserSmartTransfer()
+        async with self._semaphore:
+            try:
+                async with self._session.post(
+                    url.format(self._host),
+                    json=jsonData,
+                    auth=self._auth,
+                    timeout=self._timeout,
+                ) as resp:
+                    if resp.status == 401:
+                        raise WiserControllerAuthenticationException(
+                            "Authentication error.  Check user & password."
+                        )
+                    if resp.status == 404:
+                        raise WiserRESTException("Not Found.")
+                    resp.raise_for_status()
+                    body = await resp.read()
+            except asyncio.TimeoutError:
+                _LOGGER.debug("Connection timed out trying to update from Wiser Smart Controller")
+                raise WiserControllerTimeoutException("The connection timed out.")
+            except aiohttp.ClientResponseError:
+                raise WiserRESTException("Unknown Error.")
+            except aiohttp.ClientError:
+                _LOGGER.debug("Connection error trying to update from Wiser Controller")
+                raise WiserControllerNotFound("Wiser Controller data update failed")
+        transfer.bytes_received += len(body)
+        if not body.strip():
+            return None
+        start = monotonic()
+        try:
+            return json.loads(body)
+        finally:
+            transfer.parse_time += monotonic() - start
+
+    async def _post_stream(self, url, jsonData, key, parse, transfer=None):
+        """
+        Send a POST request and parse the list of items of the response while
+        it is received, without holding the whole body
+        :param key: key of the item list in the response
+        :param parse: function turning one item into a record, None to skip it
+        :param transfer: WiserSmartTransfer the request is measured into
+        :return: ParsedItems of the records, None if the response is empty
+        """
+        if transfer is None:
+            transfer = WiserSmartTransfer()
+        stream = JSONItemStream(key, parse)
+        async with self._semaphore:
+            try:
+                async with self._session.post(
+                    url.format(self._host),
+                    json=jsonData,
+                    auth=self._auth,
+                    timeout=self._timeout,
+                ) as resp:
+                    if resp.status == 401:
+                        raise WiserControllerAuthenticationException(
+                            "Authentication error.  Check user & password."
+                        )
+                    if resp.status == 404:
+                        raise WiserRESTException("Not Found.")
+                    resp.raise_for_status()
+                    async for chunk in resp.content.iter_chunked(STREAM_CHUNK_SIZE):
+                        transfer.bytes_received += len(chunk)
+                        start = monotonic()
+                        try:
+                            stream.feed(chunk)
+                        finally:
+                            transfer.parse_time += monotonic() - start
+            except asyncio.TimeoutError:
+                _LOGGER.debug("Connection timed out trying to update from Wiser Smart Controller")
+                raise WiserControllerTimeoutException("The connection timed out.")
+            except aiohttp.ClientResponseError:
+                raise WiserRESTException("Unknown Error.")
+            except aiohttp.ClientError:
+                _LOGGER.debug("Connection error trying to update from Wiser Controller")
+                raise WiserControllerNotFound("Wiser Controller data update failed")
+            except ValueError as ex:
+                raise WiserControllerDataInvalid(str(ex))
+        start = monotonic()
+        try:
+            return stream.close()
+        except ValueError as ex:
+            raise WiserControllerDataInvalid(str(ex))
+        finally:
+            transfer.parse_time += monotonic() - start
+
+    async def async_get_system(self, transfer=None):
+        return await self._post(
+            WISERSMARTSYSTEM, {"propertyNames": SYSTEM_PROPERTIES}, transfer
+        )
+
+    async def async_get_controller_name(self):
+        system = await self.async_get_system()
+        if system is None:
+            raise WiserControllerDataNull("Controller data null, aborting request")
+        return get_system_property(system, "ehc.gw.host.name")
+
+    def _fetch_section(self, section, parsers, transfer):
+        if section == SECTION_SYSTEM:
+            return self.async_get_system(transfer)
+        if section in parsers:
+            return self._post_stream(
+                _SECTION_URLS[section], {}, *parsers[section], transfer=transfer
+            )
+        return self._post(_SECTION_URLS[section], {}, transfer)
+
+    async def async_get_data(self, sections=ALL_SECTIONS, parsers=None, transfer=None):
+        """
+        Fetch sections of the controller data used by the integration
+        param sections: the sections to fetch, all of them by default
+        param parsers: dict of section to the key of its item list and the
+        parser of its items, for the sections to parse while streaming
+        param transfer: WiserSmartTransfer measuring the requests of this fetch
+        return: dict of section name to JSON data, or to ParsedItems for the
+        streamed sections
+        """
+        sections = list(sections)
+        parsers = parsers or {}
+        results = await asyncio.gather(
+            *[self._fetch_section(section, parsers, transfer) for section in sections]
+        )
+        data = dict(zip(sections, results))
+        for section, result in data.items():
+            if result is None:
+                raise WiserControllerDataNull(
+                    "No {} data returned by the controller".format(section)
+                )
+        return data
+
+    async def async_set_home_mode(self, hcMode, homeMode, comeBackTime):
+        homeModeData = {
+            "hcMode": hcMode,
+            "homeMode": homeMode,
+            "antiFreeze": homeMode == "holiday",
+            "endTime": comeBackTime,
+        }
+        await self._post(WISERSMARTSETMODE, homeModeData)
+
+    async def async_set_room_temps(self, temps):
+        """
+        Set the target temperature of several rooms in one request
+        param temps: dict of room name to temperature
+        """
+        roomData = {
+            "targetTemp": [
+                {"locationId": roomName, "targetValue": clamp_temperature(temp)}
+                for roomName, temp in temps.items()
+            ]
+        }
+        await self._post(WISERSMARTSETTEMP, roomData)
+
+    async def async_set_appliance_states(self, states):
+        """
+        Set the state of several appliances in one request
+        param states: dict of appliance id to state
+        """
+        applianceData = {
+            "applianceState": [
+                {"applianceId": applianceId, "state": state}
+                for applianceId, state in states.items()
+            ]
+        }
+        await self._post(WISERSMARTSETAPPLIANCESTATE, applianceData)
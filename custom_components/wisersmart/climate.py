@@ -10,7 +10,6 @@ import logging
 
 import voluptuous as vol
 
-from functools import partial
 from ruamel.yaml import YAML as yaml
 
 from homeassistant.components.climate import ClimateEntity
@@ -18,7 +17,6 @@ from homeassistant.core import callback
 
 from homeassistant.components.climate.const import (
     SUPPORT_TARGET_TEMPERATURE,
-    ATTR_CURRENT_TEMPERATURE,
     HVAC_MODE_HEAT,
     HVAC_MODE_OFF,
 )
@@ -33,25 +31,32 @@ from homeassistant.helpers.entity import Entity
 from .const import (
     _LOGGER,
     DOMAIN,
-    MANUFACTURER,
     ROOM,
     WISER_SMART_SERVICES,
 )
+from .api import SECTION_TEMPERATURES
+from .snapshot import KIND_ROOM, update_signal
+from .topology import room_device_info, room_identifier
+from .writes import DEADBAND_TEMPERATURE, WiserSmartFilteredEntity
 
 SUPPORT_FLAGS = SUPPORT_TARGET_TEMPERATURE
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
     """Set up Wiser climate device"""
-    data = hass.data[DOMAIN]
+    data = hass.data[DOMAIN][config_entry.entry_id]
 
     wiser_rooms = [
-        WiserSmartRoom(hass, data, room) for room in data.wiserSmart.getWiserRoomsThermostat()
+        WiserSmartRoom(hass, data, room) for room in data.snapshot.rooms
     ]
-    async_add_entities(wiser_rooms, True)
+    async_add_entities(wiser_rooms)
 
 
 """ Definition of WiserSmartRoom """
-class WiserSmartRoom(ClimateEntity):
+class WiserSmartRoom(WiserSmartFilteredEntity, ClimateEntity):
+    write_deadbands = {"current_temperature": DEADBAND_TEMPERATURE}
+    # Controller data sections the entity reads
+    data_sections = frozenset([SECTION_TEMPERATURES])
+
     def __init__(self, hass, data, room_id):
         """Initialize the sensor."""
         self.data = data
@@ -59,50 +64,62 @@ class WiserSmartRoom(ClimateEntity):
         self.current_temp = None
         self.target_temp = None
         self.room_id = room_id
-        self._force_update = False
+        self.command_items = ((KIND_ROOM, room_id),)
+        self._name = "WiserSmart - Thermostat - " + room_id
+        self._unique_id = room_identifier(room_id, data.id_controller)
+        self._device_info = room_device_info(room_id, data.id_controller)
+        self._hvac_mode = HVAC_MODE_OFF
+        self._icon = "mdi:radiator-off"
         self._hvac_modes_list = [HVAC_MODE_HEAT, HVAC_MODE_OFF]
         _LOGGER.info(
             "WiserSmart Room: Initialisation for {}".format(self.room_id)
         )
 
     async def async_update(self):
-        _LOGGER.debug("WiserSmartRoom: Update requested for {}".format(self.name))
-        if self._force_update:
-            await self.data.async_update(no_throttle=True)
-            self._force_update = False
-        room = self.data.wiserSmart.getWiserRoomInfo(self.room_id)
-        self.current_temp = room.get("currentValue")
-        self.target_temp = room.get("targetValue")
-        if self.target_temp is None:
-            self.target_temp = -1
+        self.async_update_from_snapshot()
+
+    @callback
+    def async_update_from_snapshot(self):
+        """Derive everything the entity exposes from one room lookup"""
+        _LOGGER.debug("WiserSmartRoom: Update requested for {}".format(self._name))
+        room = self.data.snapshot.room(self.room_id)
+        self.current_temp = room.current_temperature
+        self.target_temp = room.target_temperature
+
+        heating = room.heating
+        self._hvac_mode = HVAC_MODE_HEAT if heating else HVAC_MODE_OFF
+        # Change icon to show if radiator is heating, not heating or set to off.
+        self._icon = "mdi:radiator" if heating else "mdi:radiator-off"
+
+    def write_values(self):
+        return {
+            "available": self.available,
+            "state": self._hvac_mode,
+            "current_temperature": self.current_temp,
+            "target_temperature": self.target_temp,
+        }
 
     @property
     def supported_features(self):
         """Return the list of supported features."""
         return SUPPORT_FLAGS
 
+    @property
+    def available(self):
+        """Unavailable until cached data is confirmed by the controller"""
+        return not self.data.is_stale(self.data_sections)
+
     @property
     def should_poll(self):
         return False
 
     @property
     def state(self):
-        room = self.data.wiserSmart.getWiserRoomInfo(self.room_id)
-        self.current_temp = room.get("currentValue")
-        self.target_temp = room.get("targetValue")
-
-        if self.target_temp is None:
-            self.target_temp = -1
-
-        if self.current_temp < self.target_temp:
-            state = HVAC_MODE_HEAT
-        else:
-            state = HVAC_MODE_OFF
-        return state
+        return self._hvac_mode
 
     @property
     def name(self):
-        return "WiserSmart - Thermostat - " + self.room_id
+        return self._name
 
     @property
     def temperature_unit(self):
@@ -118,42 +135,24 @@ class WiserSmartRoom(ClimateEntity):
 
     @property
     def current_temperature(self):
-        temp = self.data.wiserSmart.getWiserRoomInfo(self.room_id).get("currentValue")
-        return temp
+        return self.current_temp
 
     @property
     def icon(self):
-        # Change icon to show if radiator is heating, not heating or set to off.
-        room = self.data.wiserSmart.getWiserRoomInfo(self.room_id)
-        self.current_temp = room.get("currentValue")
-        self.target_temp = room.get("targetValue")
-
-        if self.target_temp is None:
-            self.target_temp = -1
-
-        if self.current_temp < self.target_temp:
-            return "mdi:radiator"
-        else:
-            return "mdi:radiator-off"
-        
+        return self._icon
+
     @property
     def unique_id(self):
-        return "WiserSmartRoom - {}".format(self.room_id)
+        return self._unique_id
 
     @property
     def device_info(self):
         """Return device specific attributes."""
-        return {
-            "name": self.name,
-            "identifiers": {(DOMAIN, self.unique_id)},
-            "manufacturer": MANUFACTURER,
-            "model": "Wiser Smart Room",
-        }
+        return self._device_info
 
     @property
     def hvac_mode(self):
-        state = self.state()
-        return state
+        return self._hvac_mode
 
     @property
     def hvac_modes(self):
@@ -162,27 +161,7 @@ class WiserSmartRoom(ClimateEntity):
 
     @property
     def target_temperature(self):
-        return self.data.wiserSmart.getWiserRoomInfo(self.room_id).get("targetValue")        
-
-    @property
-    def state_attributes(self):
-        """Return state attributes."""
-        # Generic attributes
-        attrs = super().state_attributes
-
-        # If VACT return valves infos
-        i = 1
-        valves = self.data.wiserSmart.getWiserRoomInfo(self.room_id).get("valve")
-        if (valves == None):
-            return attrs
-
-        for valve in valves:
-            attrs["valvePosition_" + str(i)] = valve.get("valvePosition")
-            attrs["calibrationStatus_" + str(i)] = valve.get("calibrationStatus")
-            attrs["internalTemp_" + str(i)] = valve.get("internalTemp")
-            i = i + 1
-
-        return attrs
+        return self.target_temp
 
     async def async_set_temperature(self, **kwargs):
         """Set new target temperatures."""
@@ -196,20 +175,29 @@ class WiserSmartRoom(ClimateEntity):
         _LOGGER.debug(
             "Setting temperature for {} to {}".format(self.name, target_temperature)
         )
-        
-        await self.hass.async_add_executor_job(
-            partial(self.data.wiserSmart.setWiserRoomTemp, self.room_id, target_temperature)
-        )
-        self._force_update = True
-        await self.async_update_ha_state(True)
+
+        # The refresh that follows notifies this room if its data changed
+        await self.data.set_room_temperature(self.room_id, target_temperature)
 
         return True
 
     async def async_added_to_hass(self):
         """Subscribe for update from the Controller"""
+        # Initial state from the data fetched by the entry setup, written
+        # once the entity is added
+        self.async_update_from_snapshot()
+        self.async_filter_state_write()
 
-        async def async_update_state():
+        @callback
+        def async_update_state():
             """Update sensor state."""
-            await self.async_update_ha_state(True)
-
-        async_dispatcher_connect(self.hass, "WiserSmartUpdateMessage", async_update_state)
+            self.async_update_from_snapshot()
+            self.async_write_filtered_state()
+
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                update_signal(self.data.entry_id, KIND_ROOM, self.room_id),
+                async_update_state,
+            )
+        )
@@ -0,0 +1,98 @@
+"""
+Command queue for the Wiser Smart Controller
+
+Writes issued within a short window are collected, repeated writes to the
+same room or appliance are collapsed to the last value, and the batch is
+sent and confirmed together.
+
+https://github.com/tomtomfx/wiserSmartForHA
+thomas.fayoux@gmail.com
+
+"""
+import asyncio
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+
+from .const import _LOGGER, COMMAND_COALESCE_WINDOW
+
+
+class WiserSmartCommandQueue:
+    """Per controller queue of pending writes"""
+
+    def __init__(self, hass, send_batch, window=COMMAND_COALESCE_WINDOW):
+        """
+        :param send_batch: coroutine function sending a dict of
+        (kind, item_id) -> value to the controller
+        :param window: seconds to wait for more writes before sending
+        """
+        self._hass = hass
+        self._send_batch = send_batch
+        self._window = window
+        self._pending = {}
+        self._waiters = []
+        self._unsub_flush = None
+        # One batch in flight at a time, so that batches reach the controller
+        # and are applied in the order they were queued
+        self._lock = asyncio.Lock()
+
+    async def async_send(self, kind, item_id, value):
+        """
+        Queue a write and wait until the batch holding it has been sent
+        A later write to the same item replaces this one.
+        """
+        await self.async_send_many({(kind, item_id): value})
+
+    async def async_send_many(self, commands):
+        """
+        Queue several writes, sent in the same batch, and wait until it has been sent
+        :param commands: dict of (kind, item_id) to the value to write
+        """
+        self._pending.update(commands)
+        waiter = self._hass.loop.create_future()
+        self._waiters.append(waiter)
+        if self._unsub_flush is None:
+            self._unsub_flush = async_call_later(
+                self._hass, self._window, self._async_flush
+            )
+        await waiter
+
+    async def _async_flush(self, _now=None):
+        # Writes queued while the previous batch is sent still join this one,
+        # the window is only closed once that batch has been sent
+        async with self._lock:
+            self._unsub_flush = None
+            pending, self._pending = self._pending, {}
+            waiters, self._waiters = self._waiters, []
+            if not pending:
+                # Cancelled while waiting for the previous batch
+                return
+            await self._async_send_batch(pending, waiters)
+
+    async def _async_send_batch(self, pending, waiters):
+        _LOGGER.debug(
+            "Sending {} Wiser Smart commands for {} requests".format(
+                len(pending), len(waiters)
+            )
+        )
+        try:
+            await self._send_batch(pending)
+        except Exception as ex:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_exception(ex)
+            return
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    @callback
+    def async_cancel(self):
+        """Drop pending writes when the entry is unloaded"""
+        if self._unsub_flush is not None:
+            self._unsub_flush()
+            self._unsub_flush = None
+        for waiter in self._waiters:
+            waiter.cancel()
+        self._pending = {}
+        self._waiters = []
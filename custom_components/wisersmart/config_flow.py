@@ -1,27 +1,49 @@
 import voluptuous as vol
-from functools import partial
 from homeassistant import config_entries
 from homeassistant.const import CONF_HOST, CONF_NAME, CONF_USERNAME, CONF_PASSWORD, CONF_SCAN_INTERVAL
 from homeassistant.core import HomeAssistantError, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from .const import (
     _LOGGER,
+    CONF_CONFIRM_DELAY,
+    CONF_DEVICE_SCAN_INTERVAL,
+    CONF_OPTIMISTIC_UPDATES,
+    CONF_POLL_BUDGET,
+    CONF_POWER_DEADBAND,
+    CONF_POWER_DEADBAND_PERCENT,
+    CONF_POWER_SCAN_INTERVAL,
+    CONF_STATE_MAX_AGE,
+    CONF_TEMPERATURE_DEADBAND,
     DATA_WISER_SMART_CONFIG,
     DOMAIN,
+    DEFAULT_CONFIRM_DELAY,
+    DEFAULT_DEVICE_SCAN_INTERVAL,
+    DEFAULT_OPTIMISTIC_UPDATES,
+    DEFAULT_POLL_BUDGET,
+    DEFAULT_POWER_DEADBAND,
+    DEFAULT_POWER_DEADBAND_PERCENT,
+    DEFAULT_POWER_SCAN_INTERVAL,
     DEFAULT_SCAN_INTERVAL,
+    DEFAULT_STATE_MAX_AGE,
+    DEFAULT_TEMPERATURE_DEADBAND,
 )
-from wiserSmartAPI.wiserSmart import (
-    wiserSmart,
+from .api import (
+    WiserSmartClient,
+    WiserControllerNotFound,
     WiserControllerTimeoutException,
     WiserControllerAuthenticationException,
     WiserControllerDataNull,
     WiserRESTException,
 )
 
+# Intervals and delays in seconds, 0 would poll or write without pause
+POSITIVE_INT = vol.All(int, vol.Range(min=1))
+
 data_schema = {
     vol.Required(CONF_HOST): str,
     vol.Required(CONF_USERNAME): str,
     vol.Required(CONF_PASSWORD): str,
-    vol.Optional(CONF_SCAN_INTERVAL, default=DEFAULT_SCAN_INTERVAL): int,
+    vol.Optional(CONF_SCAN_INTERVAL, default=DEFAULT_SCAN_INTERVAL): POSITIVE_INT,
 }
 
 
@@ -30,7 +52,7 @@ class WiserSmartFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
     # The schema version of the entries that it creates
     # Home Assistant will call your migrate method if the version changes
     # (this is not implemented yet)
-    VERSION = 1
+    VERSION = 2
     CONNECTION_CLASS = config_entries.CONN_CLASS_LOCAL_POLL
 
     def __init__(self):
@@ -48,13 +70,8 @@ class WiserSmartFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
         return WiserSmartOptionsFlowHandler(config_entry)
 
     async def _test_connection(self, ip, user, password):
-        self.wiserSmart = await self.hass.async_add_executor_job(
-            partial(wiserSmart, ip, user, password)
-        )
-        try:
-            return await self.hass.async_add_executor_job(self.wiserSmart.getWiserControllerName)
-        except:
-            raise
+        client = WiserSmartClient(async_get_clientsession(self.hass), ip, user, password)
+        return await client.async_get_controller_name()
 
     async def _create_entry(self):
         """
@@ -99,7 +116,7 @@ class WiserSmartFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
                 return self.async_abort(reason="auth_failure")
             except WiserControllerTimeoutException:
                 return self.async_abort(reason="timeout_error")
-            except (WiserRESTException, WiserControllerDataNull):
+            except (WiserRESTException, WiserControllerDataNull, WiserControllerNotFound):
                 return self.async_abort(reason="not_successful")
 
         return self.async_show_form(
@@ -137,7 +154,7 @@ class WiserSmartFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
             vol.Required(CONF_HOST, default=self._host): str,
             vol.Required(CONF_USERNAME,): str,
             vol.Required(CONF_PASSWORD,): str,
-            vol.Optional(CONF_SCAN_INTERVAL, default=DEFAULT_SCAN_INTERVAL): int,
+            vol.Optional(CONF_SCAN_INTERVAL, default=DEFAULT_SCAN_INTERVAL): POSITIVE_INT,
         }
 
         return await self.async_step_user()
@@ -156,11 +173,11 @@ class WiserSmartFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
                 CONF_HOST: import_data[0][CONF_HOST],
                 CONF_USERNAME: import_data[0][CONF_USERNAME],
                 CONF_PASSWORD: import_data[0][CONF_PASSWORD],
-                CONF_SCAN_INTERVAL: import_data[0].get(
-                    CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL
+                CONF_SCAN_INTERVAL: POSITIVE_INT(
+                    import_data[0].get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)
                 ),
             }
-        except (HomeAssistantError, KeyError):
+        except (HomeAssistantError, KeyError, vol.Invalid):
             _LOGGER.debug(
                 "No valid Wiser Smart configuration found for import, delegating to user step"
             )
@@ -209,7 +226,7 @@ class WiserSmartOptionsFlowHandler(config_entries.OptionsFlow):
     async def async_step_user(self, user_input=None):
         """Manage the Wiser Smart devices options."""
         if user_input is not None:
-            self.options[CONF_SCAN_INTERVAL] = user_input[CONF_SCAN_INTERVAL]
+            self.options.update(user_input)
 
             # Update main data config instead of option config
             self.hass.config_entries.async_update_entry(
@@ -230,7 +247,61 @@ class WiserSmartOptionsFlowHandler(config_entries.OptionsFlow):
                         default=self.options.get(
                             CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL
                         ),
-                    ): int,
+                    ): POSITIVE_INT,
+                    vol.Required(
+                        CONF_POWER_SCAN_INTERVAL,
+                        default=self.options.get(
+                            CONF_POWER_SCAN_INTERVAL, DEFAULT_POWER_SCAN_INTERVAL
+                        ),
+                    ): POSITIVE_INT,
+                    vol.Required(
+                        CONF_DEVICE_SCAN_INTERVAL,
+                        default=self.options.get(
+                            CONF_DEVICE_SCAN_INTERVAL, DEFAULT_DEVICE_SCAN_INTERVAL
+                        ),
+                    ): POSITIVE_INT,
+                    vol.Required(
+                        CONF_OPTIMISTIC_UPDATES,
+                        default=self.options.get(
+                            CONF_OPTIMISTIC_UPDATES, DEFAULT_OPTIMISTIC_UPDATES
+                        ),
+                    ): bool,
+                    vol.Required(
+                        CONF_CONFIRM_DELAY,
+                        default=self.options.get(
+                            CONF_CONFIRM_DELAY, DEFAULT_CONFIRM_DELAY
+                        ),
+                    ): POSITIVE_INT,
+                    vol.Required(
+                        CONF_POLL_BUDGET,
+                        default=self.options.get(
+                            CONF_POLL_BUDGET, DEFAULT_POLL_BUDGET
+                        ),
+                    ): vol.Coerce(float),
+                    vol.Required(
+                        CONF_TEMPERATURE_DEADBAND,
+                        default=self.options.get(
+                            CONF_TEMPERATURE_DEADBAND, DEFAULT_TEMPERATURE_DEADBAND
+                        ),
+                    ): vol.Coerce(float),
+                    vol.Required(
+                        CONF_POWER_DEADBAND,
+                        default=self.options.get(
+                            CONF_POWER_DEADBAND, DEFAULT_POWER_DEADBAND
+                        ),
+                    ): vol.Coerce(float),
+                    vol.Required(
+                        CONF_POWER_DEADBAND_PERCENT,
+                        default=self.options.get(
+                            CONF_POWER_DEADBAND_PERCENT, DEFAULT_POWER_DEADBAND_PERCENT
+                        ),
+                    ): vol.Coerce(float),
+                    vol.Required(
+                        CONF_STATE_MAX_AGE,
+                        default=self.options.get(
+                            CONF_STATE_MAX_AGE, DEFAULT_STATE_MAX_AGE
+                        ),
+                    ): POSITIVE_INT,
                 }
             ),
         )
@@ -22,8 +22,75 @@ ROOM = "Room"
 NOTIFICATION_ID = "wiser_smart_notification"
 NOTIFICATION_TITLE = "Wiser Smart Component Setup"
 
+# Options
+CONF_OPTIMISTIC_UPDATES = "optimistic_updates"
+CONF_CONFIRM_DELAY = "confirm_delay"
+CONF_POWER_SCAN_INTERVAL = "power_scan_interval"
+CONF_DEVICE_SCAN_INTERVAL = "device_scan_interval"
+CONF_POLL_BUDGET = "poll_budget"
+CONF_TEMPERATURE_DEADBAND = "temperature_deadband"
+CONF_POWER_DEADBAND = "power_deadband"
+CONF_POWER_DEADBAND_PERCENT = "power_deadband_percent"
+CONF_STATE_MAX_AGE = "state_max_age"
+
+# Config entry data, set when the entry keeps the ids without its controller name
+CONF_LEGACY_UNIQUE_IDS = "legacy_unique_ids"
+
 # Default Values
 DEFAULT_SCAN_INTERVAL = 300
+DEFAULT_OPTIMISTIC_UPDATES = True
+DEFAULT_CONFIRM_DELAY = 5
+DEFAULT_POWER_SCAN_INTERVAL = 10
+DEFAULT_DEVICE_SCAN_INTERVAL = 3600
+DEFAULT_POLL_BUDGET = 3
+DEFAULT_TEMPERATURE_DEADBAND = 0.1
+DEFAULT_POWER_DEADBAND = 5
+DEFAULT_POWER_DEADBAND_PERCENT = 2
+DEFAULT_STATE_MAX_AGE = 900
+
+# Refresh tiers, each polled on its own interval: appliances and their power
+# consumption, rooms temperatures and home mode (scan interval), devices
+# batteries and controller cloud status
+TIER_APPLIANCES = "appliances"
+TIER_ROOMS = "rooms"
+TIER_DEVICES = "devices"
+
+# Fast polling after a command or a change of heating state
+FAST_SCAN_INTERVAL = 15
+FAST_SCAN_DURATION = 300
+# Shortest poll interval, entries created before it was enforced may hold 0
+MIN_SCAN_INTERVAL = 1
+
+# Offset between the polls of controllers set up together
+POLL_STAGGER = 3
+
+# Writes sent within this many seconds are sent as one batch
+COMMAND_COALESCE_WINDOW = 0.5
+
+# Polls kept for the rolling percentiles of the poll statistics
+POLL_STATS_WINDOW = 100
+# Polls kept in the history of the diagnostics
+POLL_HISTORY_SIZE = 50
+
+# Fired when a poll takes longer than the poll budget option
+EVENT_POLL_OVER_BUDGET = DOMAIN + "_poll_over_budget"
+
+# Commands kept for the latency percentiles of the command traces
+COMMAND_TRACE_WINDOW = 100
+
+# Fired by the dump_command_latencies service
+EVENT_COMMAND_LATENCIES = DOMAIN + "_command_latencies"
+
+# Last known controller data, used to create the entities at boot
+STORAGE_KEY = DOMAIN + ".{}"
+STORAGE_VERSION = 3
+CACHE_SAVE_DELAY = 60
+
+# Consecutive failures opening the controller circuit, and the backoff
+# bounds in seconds between attempts while it is open
+BREAKER_FAILURE_THRESHOLD = 3
+BACKOFF_BASE_DELAY = 15
+BACKOFF_MAX_DELAY = 600
 
 DEVICE_STATUS_ICONS = {
     "ONLINE": "mdi:remote",
@@ -42,4 +109,7 @@ WISER_SMART_HOME_MODE_ICONS = {
 WISER_SMART_SERVICES = {
     "SERVICE_SET_APPLIANCE_STATE": "set_appliance_state",
     "SERVICE_SET_HOME_MODE": "set_home_mode",
+    "SERVICE_DUMP_COMMAND_LATENCIES": "dump_command_latencies",
+    "SERVICE_SET_ROOM_TEMPERATURES": "set_room_temperatures",
+    "SERVICE_SET_APPLIANCE_STATES": "set_appliance_states",
 }
@@ -0,0 +1,80 @@
+"""
+Diagnostics for Wiser Smart config entries
+
+https://github.com/tomtomfx/wiserSmartForHA
+thomas.fayoux@gmail.com
+
+"""
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.const import CONF_HOST, CONF_PASSWORD, CONF_USERNAME
+from homeassistant.helpers import device_registry, entity_registry
+
+from .const import DOMAIN
+from .stats import POLL_STATS
+
+TO_REDACT = {CONF_HOST, CONF_PASSWORD, CONF_USERNAME}
+
+
+def _platform_counts(hass, config_entry):
+    """Return the number of entities and devices of each platform"""
+    registry = entity_registry.async_get(hass)
+    counts = {}
+    for entry in entity_registry.async_entries_for_config_entry(
+        registry, config_entry.entry_id
+    ):
+        platform = counts.setdefault(entry.domain, {"entities": 0, "devices": set()})
+        platform["entities"] += 1
+        if entry.device_id is not None:
+            platform["devices"].add(entry.device_id)
+    devices = device_registry.async_entries_for_config_entry(
+        device_registry.async_get(hass), config_entry.entry_id
+    )
+    return {
+        "devices": len(devices),
+        "platforms": {
+            domain: {"entities": platform["entities"], "devices": len(platform["devices"])}
+            for domain, platform in counts.items()
+        },
+    }
+
+
+async def async_get_config_entry_diagnostics(hass, config_entry):
+    """Return diagnostics for a config entry."""
+    data = hass.data[DOMAIN][config_entry.entry_id]
+
+    return {
+        "config_entry": async_redact_data(config_entry.as_dict(), TO_REDACT),
+        "controller": {
+            "stale_sections": sorted(data.stale_sections),
+            "health": {
+                "state": data.health.state,
+                "failures": data.health.failures,
+                "retry_in": data.health.retry_in,
+            },
+        },
+        "snapshot": async_redact_data(data.snapshot.to_cache(), TO_REDACT),
+        "registry": _platform_counts(hass, config_entry),
+        "scan_intervals": {
+            tier: {
+                "configured": scheduler.base_interval,
+                "effective": scheduler.interval,
+                "last_poll_duration": scheduler.last_duration,
+            }
+            for tier, scheduler in data.schedulers.items()
+        },
+        "polls": {
+            "count": data.stats.polls,
+            "budget": data.poll_budget,
+            "stats": {
+                name: {
+                    "last": data.stats[name].last,
+                    "p50": data.stats[name].p50,
+                    "p95": data.stats[name].p95,
+                }
+                for name in POLL_STATS
+            },
+            "history": list(data.stats.history),
+        },
+        "commands": data.tracer.as_dict(),
+        "state_writes": dict(data.state_writes),
+    }
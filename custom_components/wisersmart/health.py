@@ -0,0 +1,88 @@
+"""
+Connection health of a Wiser Smart Controller
+
+A circuit breaker: after a few consecutive failures the circuit opens and
+the controller is left alone for an exponentially growing, jittered delay.
+The first request after that delay is a probe (half-open), the only one
+allowed until its outcome is recorded; if it succeeds the circuit closes
+again, otherwise it reopens for longer.
+
+https://github.com/tomtomfx/wiserSmartForHA
+thomas.fayoux@gmail.com
+
+"""
+import random
+from time import monotonic
+
+from .const import _LOGGER, BACKOFF_BASE_DELAY, BACKOFF_MAX_DELAY, BREAKER_FAILURE_THRESHOLD
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class WiserSmartConnectionHealth:
+    """Circuit breaker with exponential backoff and jitter"""
+
+    def __init__(
+        self,
+        failure_threshold=BREAKER_FAILURE_THRESHOLD,
+        base_delay=BACKOFF_BASE_DELAY,
+        max_delay=BACKOFF_MAX_DELAY,
+    ):
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self._open_until = 0
+        self._probing = False
+
+    def backoff(self):
+        """Return the delay before the next attempt after the current failures"""
+        exponent = max(self.failures - self.failure_threshold, 0)
+        delay = min(self.base_delay * 2 ** exponent, self.max_delay)
+        # Equal jitter, controllers rebooting together are not retried together
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    @property
+    def retry_in(self):
+        """Return the seconds left before a request is allowed, 0 if allowed"""
+        if self.state != STATE_OPEN:
+            return 0
+        return max(self._open_until - monotonic(), 0)
+
+    def allow_request(self):
+        """Return whether the controller may be contacted now"""
+        if self.state == STATE_CLOSED:
+            return True
+        if self.state == STATE_OPEN:
+            if monotonic() < self._open_until:
+                return False
+            _LOGGER.debug("Wiser Smart circuit half-open, probing the controller")
+            self.state = STATE_HALF_OPEN
+        elif self._probing:
+            # Other requests wait for the outcome of the probe
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self):
+        if self.state != STATE_CLOSED:
+            _LOGGER.info("Wiser Smart Controller reachable again")
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == STATE_HALF_OPEN or self.failures >= self.failure_threshold:
+            delay = self.backoff()
+            self.state = STATE_OPEN
+            self._open_until = monotonic() + delay
+            _LOGGER.warning(
+                "Wiser Smart Controller failed {} times, pausing requests for {:.0f} seconds".format(
+                    self.failures, delay
+                )
+            )
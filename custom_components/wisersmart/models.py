@@ -0,0 +1,173 @@
+"""
+Typed records of the Wiser Smart Controller data
+
+The controller payloads are parsed once per refresh into these records,
+with units normalised (temperatures in degrees celsius, battery in percent,
+power in watts). This is the only place where payloads are validated:
+malformed items are logged and skipped, malformed sections are rejected.
+
+https://github.com/tomtomfx/wiserSmartForHA
+thomas.fayoux@gmail.com
+
+"""
+from typing import NamedTuple, Optional, Tuple, Union
+
+from .api import WiserControllerDataInvalid
+from .const import _LOGGER
+from .stream import ParsedItems
+
+# The controller reports battery levels from 0 to 10
+BATTERY_LEVEL_TO_PERCENT = 10
+
+
+class Valve(NamedTuple):
+    position: Optional[float] = None
+    calibration_status: Optional[str] = None
+    internal_temperature: Optional[float] = None
+
+
+class Room(NamedTuple):
+    name: str
+    current_temperature: Optional[float] = None
+    target_temperature: Optional[float] = None
+    valves: Tuple[Valve, ...] = ()
+
+    @property
+    def heating(self):
+        """Return whether the room is below its target temperature"""
+        return (
+            self.current_temperature is not None
+            and self.target_temperature is not None
+            and self.current_temperature < self.target_temperature
+        )
+
+
+class Device(NamedTuple):
+    name: str
+    model: Optional[str] = None
+    location: Optional[str] = None
+    power_type: Optional[str] = None
+    status: Optional[str] = None
+    battery: Optional[int] = None
+
+
+class Appliance(NamedTuple):
+    name: str
+    appliance_id: Optional[Union[int, str]] = None
+    state: bool = False
+    power: Optional[float] = None
+
+
+def _number(value):
+    """Return a controller number, None when missing"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError("expected a number, got {}".format(value))
+    if isinstance(value, (int, float)):
+        return value
+    return float(value)
+
+
+def _text(value):
+    """Return a controller string, None when missing"""
+    if value is None or isinstance(value, str):
+        return value
+    raise ValueError("expected a string, got {}".format(value))
+
+
+def _identifier(value):
+    """Return a controller identifier as it was sent, it is sent back as is"""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError("invalid identifier {}".format(value))
+    return value
+
+
+def _name(value):
+    if not isinstance(value, str) or not value:
+        raise ValueError("missing name")
+    return value
+
+
+def parse_valve(item):
+    return Valve(
+        position=_number(item.get("valvePosition")),
+        calibration_status=_text(item.get("calibrationStatus")),
+        internal_temperature=_number(item.get("internalTemp")),
+    )
+
+
+def parse_room(item):
+    return Room(
+        name=_name(item.get("locationName")),
+        current_temperature=_number(item.get("currentValue")),
+        target_temperature=_number(item.get("targetValue")),
+        valves=tuple(parse_valve(valve) for valve in item.get("valve") or ()),
+    )
+
+
+def parse_device(item):
+    battery = _number(item.get("batteryLevel"))
+    return Device(
+        name=_name(item.get("name")),
+        model=_text(item.get("modelId")),
+        location=_text(item.get("location")),
+        power_type=_text(item.get("powerType")),
+        status=_text(item.get("status")),
+        battery=None if battery is None else int(battery * BATTERY_LEVEL_TO_PERCENT),
+    )
+
+
+def parse_appliance(item):
+    return Appliance(
+        name=_name(item.get("applianceName")),
+        appliance_id=_identifier(item.get("applianceId")),
+        state=bool(item.get("state")),
+        power=_number(item.get("powerConsump")),
+    )
+
+
+def parse_item(key, parse, item):
+    """Parse one item of a controller section, None if it is malformed"""
+    try:
+        return parse(item)
+    except (AttributeError, TypeError, ValueError) as ex:
+        _LOGGER.warning("Ignoring malformed Wiser Smart {} item: {}".format(key, ex))
+        return None
+
+
+def parse_items(section, key, parse):
+    """
+    Parse the list of items of a controller section
+    :param section: the JSON data of the section, or its records if it was
+    parsed while streaming
+    :param key: key of the item list in the section
+    :param parse: function turning one item into a record
+    :return: dict of item name to record
+    :raises WiserControllerDataInvalid: if the section is not a list of items
+    """
+    if section is None:
+        return {}
+    if isinstance(section, ParsedItems):
+        return section
+    if not isinstance(section, dict):
+        raise WiserControllerDataInvalid("Invalid {} data".format(key))
+    items = section.get(key)
+    if items is None:
+        return {}
+    if not isinstance(items, list):
+        raise WiserControllerDataInvalid("Invalid {} data".format(key))
+    records = {}
+    for item in items:
+        record = parse_item(key, parse, item)
+        if record is not None:
+            records[record.name] = record
+    return records
+
+
+def room_to_cache(room):
+    return {**room._asdict(), "valves": [valve._asdict() for valve in room.valves]}
+
+
+def room_from_cache(data):
+    return Room(**{**data, "valves": tuple(Valve(**valve) for valve in data["valves"])})
@@ -0,0 +1,132 @@
+"""
+Poll scheduler for one Wiser Smart Controller
+
+The next poll is scheduled when the previous one completes, so a slow
+controller never gets overlapping fetches. Polls run at a fast interval for
+a while after something happened (a command, a room starting or stopping to
+heat) and fall back to the configured scan interval when the house is steady.
+
+https://github.com/tomtomfx/wiserSmartForHA
+thomas.fayoux@gmail.com
+
+"""
+from time import monotonic
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+
+from .api import (
+    SECTION_APPLIANCES,
+    SECTION_DEVICES,
+    SECTION_HOME_MODE,
+    SECTION_SYSTEM,
+    SECTION_TEMPERATURES,
+)
+from .const import (
+    _LOGGER,
+    FAST_SCAN_DURATION,
+    FAST_SCAN_INTERVAL,
+    MIN_SCAN_INTERVAL,
+    TIER_APPLIANCES,
+    TIER_DEVICES,
+    TIER_ROOMS,
+)
+
+# Controller data sections fetched by each refresh tier
+TIER_SECTIONS = {
+    TIER_APPLIANCES: frozenset([SECTION_APPLIANCES]),
+    TIER_ROOMS: frozenset([SECTION_TEMPERATURES, SECTION_HOME_MODE]),
+    TIER_DEVICES: frozenset([SECTION_DEVICES, SECTION_SYSTEM]),
+}
+
+
+class WiserSmartPollScheduler:
+    """Adaptive poll timer of one controller handle"""
+
+    def __init__(
+        self,
+        hass,
+        poll,
+        base_interval,
+        fast_interval=FAST_SCAN_INTERVAL,
+        fast_duration=FAST_SCAN_DURATION,
+        phase=0,
+    ):
+        """
+        :param poll: coroutine function running one poll, it must call
+        async_poll_completed when done
+        :param base_interval: seconds between polls when the house is steady
+        :param phase: seconds added once to the first scheduled poll, so that
+        controllers set up together do not poll together
+        """
+        self._hass = hass
+        self._poll = poll
+        self.base_interval = base_interval
+        self.fast_interval = fast_interval
+        self.fast_duration = fast_duration
+        self.last_duration = None
+        self._fast_until = 0
+        self._next_poll = None
+        self._unsub_poll = None
+        self._phase = phase
+        self._stopped = False
+
+    @property
+    def interval(self):
+        """Return the interval currently in use"""
+        interval = self.base_interval
+        if monotonic() < self._fast_until:
+            interval = min(self.fast_interval, interval)
+        return max(interval, MIN_SCAN_INTERVAL)
+
+    @callback
+    def async_schedule(self, delay=None):
+        """(Re)schedule the next poll, by default one interval from now"""
+        if self._stopped:
+            return
+        if delay is None:
+            delay = self.interval + self._phase % self.interval
+            self._phase = 0
+        if self._unsub_poll is not None:
+            self._unsub_poll()
+        self._next_poll = monotonic() + delay
+        self._unsub_poll = async_call_later(self._hass, delay, self._async_run_poll)
+
+    @callback
+    def async_poll_completed(self, duration, delay=None):
+        """
+        Record a finished poll, scheduled or not, and plan the next one
+        :param delay: seconds before the next poll, one interval by default
+        """
+        self.last_duration = duration
+        _LOGGER.debug(
+            "Wiser Smart poll took {:.2f}s, next one in {:.0f} seconds".format(
+                duration, self.interval if delay is None else delay
+            )
+        )
+        self.async_schedule(delay)
+
+    @callback
+    def async_speed_up(self, reason):
+        """Poll at the fast interval for a while"""
+        already_fast = monotonic() < self._fast_until
+        self._fast_until = monotonic() + self.fast_duration
+        if already_fast:
+            return
+        _LOGGER.debug("Wiser Smart fast polling after {}".format(reason))
+        # Bring the pending poll forward if it is further away than the fast interval
+        if self._next_poll is not None and self._next_poll - monotonic() > self.interval:
+            self.async_schedule()
+
+    @callback
+    def async_stop(self):
+        self._stopped = True
+        if self._unsub_poll is not None:
+            self._unsub_poll()
+            self._unsub_poll = None
+        self._next_poll = None
+
+    async def _async_run_poll(self, _now=None):
+        self._unsub_poll = None
+        self._next_poll = None
+        await self._poll()
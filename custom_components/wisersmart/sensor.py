@@ -17,59 +17,132 @@ from homeassistant.const import (
     CONF_ENTITY_NAMESPACE,
     DEVICE_CLASS_BATTERY,
     DEVICE_CLASS_POWER,
+    DEVICE_CLASS_TEMPERATURE,
     STATE_UNKNOWN,
+    TEMP_CELSIUS,
 )
+from homeassistant.core import callback
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.icon import icon_for_battery_level
 
+try:
+    from homeassistant.helpers.entity import EntityCategory
+
+    ENTITY_CATEGORY_DIAGNOSTIC = EntityCategory.DIAGNOSTIC
+except ImportError:
+    ENTITY_CATEGORY_DIAGNOSTIC = "diagnostic"
+
 from .const import (
     _LOGGER,
     DOMAIN,
-    MANUFACTURER,
     DEVICE_STATUS_ICONS,
     WISER_SMART_HOME_MODE_ICONS,
     THERMOSTAT_MIN_BATTERY_LEVEL,
     THERMOSTAT_FULL_BATTERY_LEVEL,
 )
+from .api import (
+    SECTION_APPLIANCES,
+    SECTION_DEVICES,
+    SECTION_HOME_MODE,
+    SECTION_SYSTEM,
+    SECTION_TEMPERATURES,
+)
+from .snapshot import (
+    KIND_APPLIANCE,
+    KIND_CONTROLLER,
+    KIND_DEVICE,
+    KIND_POLL_STATS,
+    KIND_VALVE,
+    update_signal,
+    valve_id,
+)
+from .topology import controller_unique_id, room_device_info
+from .writes import DEADBAND_POWER, DEADBAND_TEMPERATURE, WiserSmartFilteredEntity
+from .stats import (
+    STAT_NOTIFIED,
+    STAT_PARSE,
+    STAT_PAYLOAD,
+    STAT_RESPONSE,
+    STAT_SIGNAL,
+    STAT_SNAPSHOT,
+    STAT_TOTAL,
+)
+
+# Poll statistics exposed as sensors: name, unit, factor from the recorded value
+POLL_STAT_SENSORS = {
+    STAT_TOTAL: ("Poll Duration", "ms", 1000),
+    STAT_RESPONSE: ("Controller Response Time", "ms", 1000),
+    STAT_PARSE: ("Poll Parse Time", "ms", 1000),
+    STAT_SNAPSHOT: ("Poll Snapshot Time", "ms", 1000),
+    STAT_SIGNAL: ("Poll Signal Time", "ms", 1000),
+    STAT_PAYLOAD: ("Poll Payload Size", "B", 1),
+    STAT_NOTIFIED: ("Poll Entities Notified", None, 1),
+}
+
+# Valve values exposed as sensors: name, unit, device class, icon
+VALVE_SENSORS = {
+    "position": ("Position", "%", None, "mdi:valve"),
+    "internal_temperature": ("Internal Temperature", TEMP_CELSIUS, DEVICE_CLASS_TEMPERATURE, None),
+    "calibration_status": ("Calibration Status", None, None, "mdi:tune-vertical"),
+}
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
     """Setup the sensor platform."""
-    data = hass.data[DOMAIN]  # Get Handler
+    data = hass.data[DOMAIN][config_entry.entry_id]  # Get Handler
     wiserSmart_devices = []
 
     # Add device sensors, only if there are some
-    if data.wiserSmart.getWiserDevices() is not None:
-        for device in data.wiserSmart.getWiserDevices():
+    if data.snapshot.devices:
+        for device in data.snapshot.devices.values():
             wiserSmart_devices.append(
-                WiserSmartDeviceSensor(data, device.get("name"), device.get("modelId"))
+                WiserSmartDeviceSensor(data, device.name, device.model)
             )
 
             # Add battery sensors
-            if device.get("powerType") == "Battery":
+            if device.power_type == "Battery":
                 wiserSmart_devices.append(
-                    WiserSmartBatterySensor(data, device.get("name"), sensor_type="Battery")
+                    WiserSmartBatterySensor(data, device.name, sensor_type="Battery")
                 )
             
             # Add power sensors
-            if device.get("modelId") == "EH-ZB-SPD":
+            if device.model == "EH-ZB-SPD":
                 wiserSmart_devices.append(
-                    WiserSmartPowerSensor(data, device.get("name"), sensor_type="Power")
+                    WiserSmartPowerSensor(data, device.name, sensor_type="Power")
                 )
             
+    # Add valve sensors under the device of their room
+    for room in data.snapshot.rooms.values():
+        for number in range(1, len(room.valves) + 1):
+            for value in VALVE_SENSORS:
+                wiserSmart_devices.append(
+                    WiserSmartValveSensor(data, room.name, number, sensor_type=value)
+                )
+
     # Add cloud status sensor
-    wiserSmart_devices.append(WiserSystemCloudSensor(data, sensor_type="Cloud Sensor"))
+    wiserSmart_devices.append(
+        WiserSystemCloudSensor(data, data.unique_id, sensor_type="Cloud Sensor")
+    )
 
     # Add operation sensor
     wiserSmart_devices.append(
-        WiserSystemOperationModeSensor(data, sensor_type="Operation Mode")
+        WiserSystemOperationModeSensor(data, data.unique_id, sensor_type="Operation Mode")
     )
 
-    async_add_entities(wiserSmart_devices, True)
+    # Add poll statistics sensors
+    for stat in POLL_STAT_SENSORS:
+        wiserSmart_devices.append(
+            WiserSmartPollStatSensor(data, data.unique_id, sensor_type=stat)
+        )
 
-class WiserSmartSensor(Entity):
+    async_add_entities(wiserSmart_devices)
+
+class WiserSmartSensor(WiserSmartFilteredEntity, Entity):
     """Definition of a Wiser sensor"""
 
+    # Controller data sections the sensor reads
+    data_sections = frozenset([SECTION_DEVICES])
+
     def __init__(self, config_entry, device_id=0, sensor_type=""):
         """Initialize the sensor."""
         self.data = config_entry
@@ -78,14 +151,22 @@ class WiserSmartSensor(Entity):
         self._state = None
 
     async def async_update(self):
+        self.async_update_from_snapshot()
+
+    @callback
+    def async_update_from_snapshot(self):
         _LOGGER.debug("{} device update requested".format(self._device_name))
-        # await self.data.async_update()
 
     @property
     def name(self):
         """Return the name of the sensor"""
         return self._device_name
 
+    @property
+    def available(self):
+        """Unavailable until cached data is confirmed by the controller"""
+        return not self.data.is_stale(self.data_sections)
+
     @property
     def should_poll(self):
         """Return the polling state."""
@@ -101,17 +182,48 @@ class WiserSmartSensor(Entity):
     def unique_id(self):
         return "{}-{}".format(self._sensor_type, self._deviceId)
 
+    @property
+    def update_signals(self):
+        """Return the signals of the controller data this sensor depends on"""
+        return [update_signal(self.data.entry_id, KIND_DEVICE, self._deviceId)]
+
     async def async_added_to_hass(self):
         """Subscribe for update from the Controller"""
+        # Initial state from the data fetched by the entry setup, written
+        # once the entity is added
+        self.async_update_from_snapshot()
+        self.async_filter_state_write()
 
-        async def async_update_state():
+        @callback
+        def async_update_state():
             """Update sensor state."""
-            await self.async_update_ha_state(True)
+            self.async_update_from_snapshot()
+            self.async_write_filtered_state()
+
+        for signal in self.update_signals:
+            self.async_on_remove(
+                async_dispatcher_connect(self.hass, signal, async_update_state)
+            )
+
+
+class WiserSmartDeviceBaseSensor(WiserSmartSensor):
+    """Sensor attached to the Home Assistant device of a controller device"""
+
+    def __init__(self, data, device_id=0, sensor_type=""):
+        super().__init__(data, device_id, sensor_type)
+        self._device_info = data.topology.device(device_id).device_info
+
+    @property
+    def unique_id(self):
+        return controller_unique_id(super().unique_id, self.data.id_controller)
 
-        async_dispatcher_connect(self.hass, "WiserSmartUpdateMessage", async_update_state)
+    @property
+    def device_info(self):
+        """Return device specific attributes."""
+        return self._device_info
 
 
-class WiserSmartBatterySensor(WiserSmartSensor):
+class WiserSmartBatterySensor(WiserSmartDeviceBaseSensor):
     """Definition of a battery sensor for Wiser Smart"""
 
     def __init__(self, data, device_id=0, sensor_type=""):
@@ -122,14 +234,15 @@ class WiserSmartBatterySensor(WiserSmartSensor):
         self._state = "Unknown"
         _LOGGER.info("{} device init".format(self._device_name))
 
-    async def async_update(self):
-        """Fetch new state data for the sensor."""
-        await super().async_update()
+    @callback
+    def async_update_from_snapshot(self):
+        """Read the sensor state from the controller snapshot."""
+        super().async_update_from_snapshot()
 
-        device = self.data.wiserSmart.getWiserDeviceInfo(self._deviceId)
+        device = self.data.snapshot.device(self._deviceId)
 
         # Set battery info
-        self._state = device.get("batteryLevel") * 10
+        self._state = device.battery
 
     @property
     def device_class(self):
@@ -146,9 +259,7 @@ class WiserSmartBatterySensor(WiserSmartSensor):
         """Return the state attributes of the battery."""
         attrs = {}
 
-        attrs[ATTR_BATTERY_LEVEL] = (
-            self.data.wiserSmart.getWiserDeviceInfo(self._deviceId).get("batteryLevel") * 10 or None
-        )
+        attrs[ATTR_BATTERY_LEVEL] = self.data.snapshot.device(self._deviceId).battery or None
         return attrs
 
     def get_device_name(self):
@@ -160,24 +271,13 @@ class WiserSmartBatterySensor(WiserSmartSensor):
             + " - Battery Level"
         )
 
-    @property
-    def device_info(self):
-        """Return device specific attributes."""
-        model = self.data.wiserSmart.getWiserDeviceInfo(self._deviceId).get("modelId")
-        identifier = "WiserSmart - {}".format(self._deviceId)
-        if model == "EH-ZB-RTS":
-            identifier = "WiserSmartRoom - {}".format(self.data.wiserSmart.getWiserDeviceInfo(self._deviceId).get("location"))
-            model = "Wiser Smart Room"
 
-        return {
-            "identifiers": {(DOMAIN, identifier)},
-            "manufacturer": MANUFACTURER,
-            "model": model,
-        }
-
-class WiserSmartPowerSensor(WiserSmartSensor):
+class WiserSmartPowerSensor(WiserSmartDeviceBaseSensor):
     """Definition of a power sensor for Wiser Smart"""
 
+    write_deadbands = {"state": DEADBAND_POWER, "power": DEADBAND_POWER}
+    data_sections = frozenset([SECTION_APPLIANCES])
+
     def __init__(self, data, device_id=0, sensor_type=""):
         super().__init__(data, device_id, sensor_type)
         self._device_name = self.get_device_name()
@@ -186,12 +286,18 @@ class WiserSmartPowerSensor(WiserSmartSensor):
         self._state = "Unknown"
         _LOGGER.info("{} device init".format(self._device_name))
 
-    async def async_update(self):
-        """Fetch new state data for the sensor."""
-        await super().async_update()
-        appliance = self.data.wiserSmart.getWiserApplianceInfo(self._deviceId)
+    @callback
+    def async_update_from_snapshot(self):
+        """Read the sensor state from the controller snapshot."""
+        super().async_update_from_snapshot()
+        appliance = self.data.snapshot.appliance(self._deviceId)
         # Set power info
-        self._state = appliance.get("powerConsump")
+        self._state = appliance.power
+
+    @property
+    def update_signals(self):
+        """Return the signals of the controller data this sensor depends on"""
+        return [update_signal(self.data.entry_id, KIND_APPLIANCE, self._deviceId)]
 
     @property
     def device_class(self):
@@ -207,9 +313,7 @@ class WiserSmartPowerSensor(WiserSmartSensor):
     def device_state_attributes(self):
         """Return the state attributes of the battery."""
         attrs = {}
-        attrs["power"] = (
-            self.data.wiserSmart.getWiserApplianceInfo(self._deviceId).get("powerConsump") or None
-        )
+        attrs["power"] = self.data.snapshot.appliance(self._deviceId).power or None
         return attrs
 
     def get_device_name(self):
@@ -221,20 +325,14 @@ class WiserSmartPowerSensor(WiserSmartSensor):
             + " - Power"
         )
 
-    @property
-    def device_info(self):
-        """Return device specific attributes."""
-        model = self.data.wiserSmart.getWiserDeviceInfo(self._deviceId).get("modelId")
-        identifier = "WiserSmart - {}".format(self._deviceId)
-        return {
-            "identifiers": {(DOMAIN, identifier)},
-            "manufacturer": MANUFACTURER,
-            "model": model,
-        }
 
-class WiserSmartDeviceSensor(WiserSmartSensor):
+class WiserSmartDeviceSensor(WiserSmartDeviceBaseSensor):
     """Definition of Wiser Smart Device Sensor"""
 
+    write_deadbands = {"power_consumption": DEADBAND_POWER}
+    # Plugs and actuators also show the power of their appliance
+    data_sections = frozenset([SECTION_DEVICES, SECTION_APPLIANCES])
+
     def __init__(self, data, device_id=0, sensor_type=""):
         super().__init__(data, device_id, sensor_type)
         self._device_name = self.get_device_name()
@@ -243,31 +341,12 @@ class WiserSmartDeviceSensor(WiserSmartSensor):
         self._power_consump = None
         _LOGGER.info("{} device init".format(self._device_name))
 
-    async def async_update(self):
-        """Fetch new state data for the sensor."""
-        await super().async_update()
-        self._state = self.data.wiserSmart.getWiserDeviceInfo(self._deviceId).get(
-            "status"
-        )
+    @callback
+    def async_update_from_snapshot(self):
+        """Read the sensor state from the controller snapshot."""
+        super().async_update_from_snapshot()
+        self._state = self.data.snapshot.device(self._deviceId).status
 
-    @property
-    def device_info(self):
-        """Return device specific attributes."""
-        model = self.data.wiserSmart.getWiserDeviceInfo(self._deviceId).get("modelId")
-        identifier = "WiserSmart - {}".format(self._deviceId)
-
-        # Thermostats and heaters
-        if (self.data.wiserSmart.getWiserDeviceInfo(self._deviceId).get("modelId") in ["EH-ZB-RTS", "EH-ZB-HACT", "EH-ZB-VACT"]):
-            identifier = "WiserSmartRoom - {}".format(self.data.wiserSmart.getWiserDeviceInfo(self._deviceId).get("location"))
-            model = "Wiser Smart Room"
-
-        if (identifier != None):
-            return {
-                "identifiers": {(DOMAIN, identifier)},
-                "manufacturer": MANUFACTURER,
-                "model": model,
-            }
-        return None
 
     def get_device_name(self):
         """Return the name of the Device"""
@@ -277,13 +356,21 @@ class WiserSmartDeviceSensor(WiserSmartSensor):
             + self._deviceId
         )
 
+    @property
+    def update_signals(self):
+        """Return the signals of the controller data this sensor depends on"""
+        signals = super().update_signals
+        if self._sensor_type in ["EH-ZB-SPD", "EH-ZB-LMACT"]:
+            signals.append(
+                update_signal(self.data.entry_id, KIND_APPLIANCE, self._deviceId)
+            )
+        return signals
+
     @property
     def icon(self):
         """Return icon for connection status"""
         try:
-            return DEVICE_STATUS_ICONS[
-                self.data.wiserSmart.getWiserDeviceInfo(self._deviceId).get("status")
-            ]
+            return DEVICE_STATUS_ICONS[self.data.snapshot.device(self._deviceId).status]
         except KeyError:
             # Handle anything else as no signal
             return DEVICE_STATUS_ICONS["OFFLINE"]
@@ -294,33 +381,105 @@ class WiserSmartDeviceSensor(WiserSmartSensor):
             "State attributes for {} {}".format(self._deviceId, self._sensor_type)
         )
         attrs = {}
-        device_data = self.data.wiserSmart.getWiserDeviceInfo(self._deviceId)
+        device_data = self.data.snapshot.device(self._deviceId)
 
         """ Generic attributes """
         attrs["vendor"] = "Schneider Electric"
-        attrs["model_identifier"] = device_data.get("modelId")
+        attrs["model_identifier"] = device_data.model
 
         if self._sensor_type in ["EH-ZB-RTS"]:
-            attrs["battery_level"] = device_data.get("batteryLevel") * 10
+            attrs["battery_level"] = device_data.battery
             
         elif self._sensor_type in ["EH-ZB-SPD", "EH-ZB-LMACT"]:
-            appliance = self.data.wiserSmart.getWiserApplianceInfo(self._deviceId)
-            attrs["power_consumption"] = appliance.get("powerConsump")
+            appliance = self.data.snapshot.appliance(self._deviceId)
+            attrs["power_consumption"] = appliance.power
         
         return attrs
 
+class WiserSmartValveSensor(WiserSmartSensor):
+    """Sensor for one value of a room valve, notified only when its valve changes"""
+
+    data_sections = frozenset([SECTION_TEMPERATURES])
+
+    def __init__(self, data, room_id, number, sensor_type=""):
+        super().__init__(data, valve_id(room_id, number), sensor_type)
+        self._room_id = room_id
+        self._number = number
+        self._label, self._unit, self._device_class, self._icon = VALVE_SENSORS[sensor_type]
+        if sensor_type == "internal_temperature":
+            self.write_deadbands = {"state": DEADBAND_TEMPERATURE}
+        self._device_name = self.get_device_name()
+        _LOGGER.info("{} device init".format(self._device_name))
+
+    @callback
+    def async_update_from_snapshot(self):
+        """Read the valve value from the controller snapshot."""
+        super().async_update_from_snapshot()
+        valve = self.data.snapshot.valve(self._room_id, self._number)
+        self._state = getattr(valve, self._sensor_type)
+
+    @property
+    def unique_id(self):
+        return controller_unique_id(
+            "Valve {}-{}".format(self._sensor_type, self._deviceId),
+            self.data.id_controller,
+        )
+
+    @property
+    def entity_category(self):
+        if self._sensor_type == "calibration_status":
+            return ENTITY_CATEGORY_DIAGNOSTIC
+        return None
+
+    @property
+    def entity_registry_enabled_default(self):
+        """Calibration status is not recorded unless enabled"""
+        return self._sensor_type != "calibration_status"
+
+    @property
+    def device_info(self):
+        """Return the device of the room of the valve."""
+        return room_device_info(self._room_id, self.data.id_controller)
+
+    def get_device_name(self):
+        """Return the name of the Device """
+        return "WiserSmart - Valve {} - {} {}".format(
+            self._number, self._room_id, self._label
+        )
+
+    @property
+    def update_signals(self):
+        """Return the signals of the controller data this sensor depends on"""
+        return [update_signal(self.data.entry_id, KIND_VALVE, self._deviceId)]
+
+    @property
+    def device_class(self):
+        return self._device_class
+
+    @property
+    def unit_of_measurement(self):
+        return self._unit
+
+    @property
+    def icon(self):
+        return self._icon
+
+
 class WiserSystemCloudSensor(WiserSmartSensor):
     """Sensor to display the status of the Wiser Cloud"""
 
+    data_sections = frozenset([SECTION_SYSTEM])
+
     def __init__(self, data, device_id=0, sensor_type=""):
         super().__init__(data, device_id, sensor_type)
         self._device_name = self.get_device_name()
         _LOGGER.info("{} device init".format(self._device_name))
 
-    async def async_update(self):
-        """Fetch new state data for the sensor."""
-        await super().async_update()
-        self._state = self.data.wiserSmart.getWiserControllerCloudConnection()
+    @callback
+    def async_update_from_snapshot(self):
+        """Read the sensor state from the controller snapshot."""
+        super().async_update_from_snapshot()
+        self._state = self.data.snapshot.cloud_connection
 
     @property
     def device_info(self):
@@ -333,6 +492,11 @@ class WiserSystemCloudSensor(WiserSmartSensor):
         """Return the name of the Device """
         return "Wiser Smart Cloud Status"
 
+    @property
+    def update_signals(self):
+        """Return the signals of the controller data this sensor depends on"""
+        return [update_signal(self.data.entry_id, KIND_CONTROLLER)]
+
     @property
     def icon(self):
         if self._state == "up":
@@ -344,15 +508,19 @@ class WiserSystemCloudSensor(WiserSmartSensor):
 class WiserSystemOperationModeSensor(WiserSmartSensor):
     """Sensor for the Wiser Smart Home Mode (manual, schedule, holiday, energysaver)"""
 
+    command_items = ((KIND_CONTROLLER, None),)
+    data_sections = frozenset([SECTION_HOME_MODE])
+
     def __init__(self, data, device_id=0, sensor_type=""):
         super().__init__(data, device_id, sensor_type)
         self._device_name = self.get_device_name()
         _LOGGER.info("{} device init".format(self._device_name))
 
-    async def async_update(self):
-        """Fetch new state data for the sensor."""
-        await super().async_update()
-        self._state = self._state = self.data.wiserSmart.getWiserHomeMode()
+    @callback
+    def async_update_from_snapshot(self):
+        """Read the sensor state from the controller snapshot."""
+        super().async_update_from_snapshot()
+        self._state = self._state = self.data.snapshot.home_mode
 
     @property
     def device_info(self):
@@ -365,6 +533,80 @@ class WiserSystemOperationModeSensor(WiserSmartSensor):
         """Return the name of the Device """
         return "Wiser Operation Mode"
 
+    @property
+    def update_signals(self):
+        """Return the signals of the controller data this sensor depends on"""
+        return [update_signal(self.data.entry_id, KIND_CONTROLLER)]
+
+    @property
+    def icon(self):
+        return WISER_SMART_HOME_MODE_ICONS.get(self._state)
+
+
+class WiserSmartPollStatSensor(WiserSmartSensor):
+    """Diagnostic sensor for one measure of the controller polls"""
+
+    # Written on every poll, only recorded once enabled by the user
+    entity_registry_enabled_default = False
+
+    def __init__(self, data, device_id=0, sensor_type=""):
+        super().__init__(data, device_id, sensor_type)
+        self._label, self._unit, self._factor = POLL_STAT_SENSORS[sensor_type]
+        self._device_name = self.get_device_name()
+        _LOGGER.info("{} device init".format(self._device_name))
+
+    def _scale(self, value):
+        if value is None:
+            return None
+        return round(value * self._factor, 1)
+
+    @callback
+    def async_update_from_snapshot(self):
+        """Read the last poll measure."""
+        super().async_update_from_snapshot()
+        self._state = self._scale(self.data.stats[self._sensor_type].last)
+
+    @property
+    def unique_id(self):
+        return "Poll {}-{}".format(self._sensor_type, self._deviceId)
+
+    @property
+    def available(self):
+        """Poll statistics do not depend on cached data"""
+        return True
+
+    @property
+    def entity_category(self):
+        return ENTITY_CATEGORY_DIAGNOSTIC
+
+    @property
+    def device_info(self):
+        """Return device specific attributes."""
+        return {
+            "identifiers": {(DOMAIN, self.data.unique_id)},
+        }
+
+    def get_device_name(self):
+        """Return the name of the Device """
+        return "Wiser Smart {}".format(self._label)
+
+    @property
+    def update_signals(self):
+        """Return the signals of the controller data this sensor depends on"""
+        return [update_signal(self.data.entry_id, KIND_POLL_STATS)]
+
+    @property
+    def unit_of_measurement(self):
+        return self._unit
+
     @property
     def icon(self):
-        return WISER_SMART_HOME_MODE_ICONS[self._state]
+        return "mdi:timer-outline" if self._unit == "ms" else "mdi:chart-line"
+
+    @property
+    def extra_state_attributes(self):
+        stat = self.data.stats[self._sensor_type]
+        return {
+            "p50": self._scale(stat.p50),
+            "p95": self._scale(stat.p95),
+        }
@@ -0,0 +1,334 @@
+"""
+Controller data snapshot for Wiser Smart
+
+Built once after each controller refresh so that entities can look up
+rooms, devices and appliances records by id without walking the controller
+payload.
+
+https://github.com/tomtomfx/wiserSmartForHA
+thomas.fayoux@gmail.com
+
+"""
+from functools import partial
+from types import MappingProxyType
+
+from .api import (
+    SECTION_APPLIANCES,
+    SECTION_DEVICES,
+    SECTION_HOME_MODE,
+    SECTION_SYSTEM,
+    SECTION_TEMPERATURES,
+    get_system_property,
+)
+from .models import (
+    Appliance,
+    Device,
+    Room,
+    Valve,
+    parse_appliance,
+    parse_device,
+    parse_item,
+    parse_items,
+    parse_room,
+    room_from_cache,
+    room_to_cache,
+)
+
+EMPTY = MappingProxyType({})
+
+UPDATE_MESSAGE = "WiserSmartUpdateMessage"
+
+# Kinds of data an entity can subscribe to
+KIND_ROOM = "room"
+KIND_VALVE = "valve"
+KIND_DEVICE = "device"
+KIND_APPLIANCE = "appliance"
+KIND_CONTROLLER = "controller"
+KIND_POLL_STATS = "poll_stats"
+
+
+def update_signal(entry_id, kind, item_id=None):
+    """
+    Return the dispatcher signal fired when one item of a controller changes
+    :param entry_id: config entry id of the controller
+    """
+    if item_id is None:
+        return "{}_{}_{}".format(UPDATE_MESSAGE, entry_id, kind)
+    return "{}_{}_{}_{}".format(UPDATE_MESSAGE, entry_id, kind, item_id)
+
+
+def valve_id(room_id, number):
+    """Return the id of the valve number (from 1) of a room"""
+    return "{}-{}".format(room_id, number)
+
+
+# Snapshot attribute holding each kind of item
+_SECTIONS = {
+    KIND_ROOM: "rooms",
+    KIND_DEVICE: "devices",
+    KIND_APPLIANCE: "appliances",
+}
+
+
+# Record type of each kind of item
+_RECORDS = {
+    KIND_ROOM: Room,
+    KIND_DEVICE: Device,
+    KIND_APPLIANCE: Appliance,
+}
+
+
+# Controller data section holding each kind of item
+KIND_SECTIONS = {
+    KIND_ROOM: SECTION_TEMPERATURES,
+    KIND_DEVICE: SECTION_DEVICES,
+    KIND_APPLIANCE: SECTION_APPLIANCES,
+}
+
+
+# Item list of each section and the parser of its items, for the sections
+# parsed while the controller response is received
+SECTION_PARSERS = {
+    SECTION_TEMPERATURES: (
+        "locationTempDetails",
+        partial(parse_item, "locationTempDetails", parse_room),
+    ),
+    SECTION_DEVICES: ("device", partial(parse_item, "device", parse_device)),
+    SECTION_APPLIANCES: (
+        "applianceDetails",
+        partial(parse_item, "applianceDetails", parse_appliance),
+    ),
+}
+
+
+def _changed_keys(previous, current):
+    """Return the keys added, removed or modified between two indexes"""
+    keys = previous.keys() | current.keys()
+    return [
+        key
+        for key in keys
+        if previous.get(key) is not current.get(key)
+        and previous.get(key) != current.get(key)
+    ]
+
+
+def _room_changes(room_id, previous, room):
+    """
+    Return the room and the valves that changed between two records of a room,
+    so that valve changes do not notify the room
+    """
+    previous_valves = previous.valves if previous else ()
+    valves = room.valves if room else ()
+    changes = [
+        (KIND_VALVE, valve_id(room_id, number))
+        for number in range(1, max(len(previous_valves), len(valves)) + 1)
+        if previous_valves[number - 1 : number] != valves[number - 1 : number]
+    ]
+    if (
+        previous is None
+        or room is None
+        or previous._replace(valves=()) != room._replace(valves=())
+    ):
+        changes.insert(0, (KIND_ROOM, room_id))
+    return changes
+
+
+def _index(section, key, parse):
+    """Index the records of a controller section by name"""
+    return MappingProxyType(parse_items(section, key, parse))
+
+
+def _text(value):
+    return value if isinstance(value, str) else None
+
+
+class WiserSmartSnapshot:
+    """Immutable, indexed view of the controller data at one point in time"""
+
+    __slots__ = ("rooms", "devices", "appliances", "home_mode", "cloud_connection")
+
+    def __init__(self, rooms, devices, appliances, home_mode, cloud_connection):
+        object.__setattr__(self, "rooms", rooms)
+        object.__setattr__(self, "devices", devices)
+        object.__setattr__(self, "appliances", appliances)
+        object.__setattr__(self, "home_mode", home_mode)
+        object.__setattr__(self, "cloud_connection", cloud_connection)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("WiserSmartSnapshot is immutable")
+
+    @classmethod
+    def from_data(cls, data, previous=None):
+        """
+        Build a snapshot from the sections returned by WiserSmartClient.async_get_data
+        :param data: dict of section name to JSON data, may hold only some sections
+        :param previous: snapshot providing the sections missing from data
+        """
+        fields = {
+            attr: getattr(previous or EMPTY_SNAPSHOT, attr) for attr in cls.__slots__
+        }
+        if SECTION_TEMPERATURES in data:
+            fields["rooms"] = _index(
+                data[SECTION_TEMPERATURES], "locationTempDetails", parse_room
+            )
+        if SECTION_DEVICES in data:
+            fields["devices"] = _index(data[SECTION_DEVICES], "device", parse_device)
+        if SECTION_APPLIANCES in data:
+            fields["appliances"] = _index(
+                data[SECTION_APPLIANCES], "applianceDetails", parse_appliance
+            )
+        if SECTION_HOME_MODE in data:
+            fields["home_mode"] = _text((data[SECTION_HOME_MODE] or {}).get("homeMode"))
+        if SECTION_SYSTEM in data:
+            fields["cloud_connection"] = _text(
+                get_system_property(data[SECTION_SYSTEM], "ehc.wcs2.cloud.status")
+            )
+        return cls(**fields)
+
+    @classmethod
+    def from_cache(cls, cache):
+        """
+        Build a snapshot from the output of to_cache
+        :raises KeyError, TypeError, AttributeError: if the cache is malformed
+        """
+        return cls(
+            rooms=MappingProxyType(
+                {room["name"]: room_from_cache(room) for room in cache["rooms"]}
+            ),
+            devices=MappingProxyType(
+                {device["name"]: Device(**device) for device in cache["devices"]}
+            ),
+            appliances=MappingProxyType(
+                {
+                    appliance["name"]: Appliance(**appliance)
+                    for appliance in cache["appliances"]
+                }
+            ),
+            home_mode=cache["home_mode"],
+            cloud_connection=cache["cloud_connection"],
+        )
+
+    def to_cache(self):
+        """Return the snapshot as JSON serialisable data"""
+        return {
+            "rooms": [room_to_cache(room) for room in self.rooms.values()],
+            "devices": [device._asdict() for device in self.devices.values()],
+            "appliances": [appliance._asdict() for appliance in self.appliances.values()],
+            "home_mode": self.home_mode,
+            "cloud_connection": self.cloud_connection,
+        }
+
+    def room(self, room_id):
+        """Return the record of a room, an empty one if unknown"""
+        return self.rooms.get(room_id) or Room(room_id)
+
+    def valve(self, room_id, number):
+        """Return the record of the valve number (from 1) of a room, an empty one if unknown"""
+        valves = self.room(room_id).valves
+        if 0 < number <= len(valves):
+            return valves[number - 1]
+        return Valve()
+
+    def device(self, device_id):
+        """Return the record of a device, an empty one if unknown"""
+        return self.devices.get(device_id) or Device(device_id)
+
+    def appliance(self, appliance_id):
+        """Return the record of an appliance, an empty one if unknown"""
+        return self.appliances.get(appliance_id) or Appliance(appliance_id)
+
+    def heating_rooms(self):
+        """Return the ids of the rooms below their target temperature"""
+        return frozenset(room_id for room_id, room in self.rooms.items() if room.heating)
+
+    def patch(self, kind, item_id=None, **values):
+        """
+        Return a copy of the snapshot with some values of one item replaced
+        :param kind: KIND_ROOM, KIND_DEVICE, KIND_APPLIANCE or KIND_CONTROLLER
+        :param item_id: id of the item, unused for the controller
+        :param values: record fields and their new values
+        :return: the patched snapshot
+        """
+        fields = {attr: getattr(self, attr) for attr in self.__slots__}
+        if kind == KIND_CONTROLLER:
+            fields.update(values)
+        else:
+            attr = _SECTIONS[kind]
+            index = dict(fields[attr])
+            index[item_id] = (index.get(item_id) or _RECORDS[kind](item_id))._replace(**values)
+            fields[attr] = MappingProxyType(index)
+        return WiserSmartSnapshot(**fields)
+
+    def merge_items(self, data, kind, item_ids):
+        """
+        Return a copy of the snapshot with some items taken from fresh data
+        :param data: dict holding the controller data section of the items
+        :param kind: KIND_ROOM, KIND_DEVICE or KIND_APPLIANCE
+        :param item_ids: ids of the items to take, other items are kept
+        :return: the merged snapshot
+        """
+        attr = _SECTIONS[kind]
+        fresh = getattr(WiserSmartSnapshot.from_data(data), attr)
+        index = dict(getattr(self, attr))
+        for item_id in item_ids:
+            if item_id in fresh:
+                index[item_id] = fresh[item_id]
+            else:
+                index.pop(item_id, None)
+        fields = {attr: getattr(self, attr) for attr in self.__slots__}
+        fields[attr] = MappingProxyType(index)
+        return WiserSmartSnapshot(**fields)
+
+    def keep_items(self, other, items):
+        """
+        Return a copy of the snapshot with some items taken from another snapshot
+        :param other: the snapshot holding the items to keep
+        :param items: iterable of (kind, item_id)
+        :return: the snapshot with these items
+        """
+        fields = {attr: getattr(self, attr) for attr in self.__slots__}
+        indexes = {}
+        for kind, item_id in items:
+            if kind == KIND_CONTROLLER:
+                fields["home_mode"] = other.home_mode
+                continue
+            attr = _SECTIONS[kind]
+            index = indexes.setdefault(attr, dict(fields[attr]))
+            if item_id in getattr(other, attr):
+                index[item_id] = getattr(other, attr)[item_id]
+            else:
+                index.pop(item_id, None)
+        for attr, index in indexes.items():
+            fields[attr] = MappingProxyType(index)
+        return WiserSmartSnapshot(**fields)
+
+    def diff(self, previous):
+        """
+        Return every item that changed since the previous snapshot
+        :param previous: the snapshot this one replaces, or None
+        :return: list of (kind, item_id), item_id is None for the controller
+        """
+        if previous is None:
+            previous = EMPTY_SNAPSHOT
+        changed = []
+        for kind, attr in _SECTIONS.items():
+            previous_items, items = getattr(previous, attr), getattr(self, attr)
+            # Sections kept from the previous snapshot are the same objects
+            if previous_items is items:
+                continue
+            for key in _changed_keys(previous_items, items):
+                if kind == KIND_ROOM:
+                    changed.extend(
+                        _room_changes(key, previous_items.get(key), items.get(key))
+                    )
+                else:
+                    changed.append((kind, key))
+        if (
+            previous.home_mode != self.home_mode
+            or previous.cloud_connection != self.cloud_connection
+        ):
+            changed.append((KIND_CONTROLLER, None))
+        return changed
+
+
+EMPTY_SNAPSHOT = WiserSmartSnapshot(EMPTY, EMPTY, EMPTY, None, None)
@@ -0,0 +1,114 @@
+"""
+Poll pipeline statistics for Wiser Smart
+
+Keeps the last value and a rolling window of each measure of the poll
+pipeline (controller response, JSON parsing, snapshot, update signals) so
+they can be exposed as diagnostic sensors.
+
+https://github.com/tomtomfx/wiserSmartForHA
+thomas.fayoux@gmail.com
+
+"""
+from collections import deque
+
+import homeassistant.util.dt as dt_util
+
+from .const import POLL_HISTORY_SIZE, POLL_STATS_WINDOW
+
+# Outcomes of a poll
+OUTCOME_SUCCESS = "success"
+OUTCOME_FAILED = "failed"
+OUTCOME_SKIPPED = "skipped"
+
+# Measures of one poll
+STAT_TOTAL = "total"
+STAT_RESPONSE = "response"
+STAT_PARSE = "parse"
+STAT_SNAPSHOT = "snapshot"
+# Sending the update signals, entities write their state after the poll
+STAT_SIGNAL = "signal"
+STAT_PAYLOAD = "payload"
+STAT_NOTIFIED = "notified"
+
+POLL_STATS = [
+    STAT_TOTAL,
+    STAT_RESPONSE,
+    STAT_PARSE,
+    STAT_SNAPSHOT,
+    STAT_SIGNAL,
+    STAT_PAYLOAD,
+    STAT_NOTIFIED,
+]
+
+
+class RollingStat:
+    """Last value and rolling percentiles of one measure"""
+
+    def __init__(self, size=POLL_STATS_WINDOW):
+        self.last = None
+        self._values = deque(maxlen=size)
+
+    def add(self, value):
+        self.last = value
+        self._values.append(value)
+
+    def percentile(self, pct):
+        """Return the nearest-rank percentile of the window, None if empty"""
+        if not self._values:
+            return None
+        ordered = sorted(self._values)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    @property
+    def p50(self):
+        return self.percentile(50)
+
+    @property
+    def p95(self):
+        return self.percentile(95)
+
+
+class WiserSmartPollStats:
+    """Statistics of the polls of one controller"""
+
+    def __init__(self, size=POLL_STATS_WINDOW, history=POLL_HISTORY_SIZE):
+        self.stats = {name: RollingStat(size) for name in POLL_STATS}
+        self.polls = 0
+        # Last polls, failed ones included
+        self.history = deque(maxlen=history)
+
+    def __getitem__(self, name):
+        return self.stats[name]
+
+    def record(self, measures, sections=()):
+        """
+        Record one successful poll
+        :param measures: dict of measure name to value, times in seconds
+        :param sections: the controller data sections polled
+        """
+        self.polls += 1
+        for name, value in measures.items():
+            self.stats[name].add(value)
+        self._add_history(
+            sections,
+            OUTCOME_SUCCESS,
+            measures.get(STAT_TOTAL),
+            measures.get(STAT_PAYLOAD),
+            measures.get(STAT_NOTIFIED),
+        )
+
+    def record_failure(self, sections, duration, outcome=OUTCOME_FAILED):
+        """Record a poll that failed or was skipped"""
+        self._add_history(sections, outcome, duration, None, None)
+
+    def _add_history(self, sections, outcome, duration, payload, notified):
+        self.history.append(
+            {
+                "time": dt_util.utcnow().isoformat(),
+                "sections": sorted(sections),
+                "outcome": outcome,
+                "duration": duration,
+                "payload_bytes": payload,
+                "entities_notified": notified,
+            }
+        )
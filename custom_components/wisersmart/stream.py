@@ -0,0 +1,160 @@
+"""
+Incremental parsing of the Wiser Smart Controller item lists
+
+The rooms, devices and appliances responses are a JSON object holding one
+list of items. They are decoded chunk by chunk as they are received, each
+item being turned into its record as soon as it is complete, so that
+neither the whole body nor the whole decoded tree is ever held.
+
+https://github.com/tomtomfx/wiserSmartForHA
+thomas.fayoux@gmail.com
+
+"""
+import codecs
+import json
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",]}"
+
+
+class ParsedItems(dict):
+    """Records of a section, by name, parsed while the response was received"""
+
+
+class JSONItemStream:
+    """
+    Incremental parser of a JSON object holding a list of items
+    Other members of the object are decoded and dropped.
+    """
+
+    def __init__(self, key, parse):
+        """
+        :param key: key of the item list in the object
+        :param parse: function turning one item into a record, None to skip it
+        """
+        self._key = key
+        self._parse = parse
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._pos = 0
+        # object, first_key, key, colon, value, first_item, items, item, comma, done
+        self._state = "object"
+        self._member = None
+        self.empty = True
+        self.items = ParsedItems()
+
+    def feed(self, chunk):
+        """Parse a chunk of the response body"""
+        text = self._decoder.decode(chunk)
+        if not text:
+            return
+        if self.empty and text.strip(_WHITESPACE):
+            self.empty = False
+        # Drop what was consumed, only a partial value is carried over
+        self._buffer = self._buffer[self._pos :] + text
+        self._pos = 0
+        self._parse_buffer(final=False)
+
+    def close(self):
+        """
+        Parse the end of the body
+        :return: the records, None if the body was empty
+        :raises ValueError: if the body is not an object holding a list of items
+        """
+        self._buffer = self._buffer[self._pos :] + self._decoder.decode(b"", final=True)
+        self._pos = 0
+        if self.empty:
+            return None
+        self._parse_buffer(final=True)
+        if self._state != "done" or self._buffer[self._pos :].strip(_WHITESPACE):
+            raise ValueError("Truncated or invalid {} data".format(self._key))
+        return self.items
+
+    def _skip_whitespace(self):
+        while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+            self._pos += 1
+        return self._pos < len(self._buffer)
+
+    def _expect(self, char):
+        if self._buffer[self._pos] != char:
+            raise ValueError(
+                "Invalid {} data, expected {} at {}".format(self._key, char, self._pos)
+            )
+        self._pos += 1
+
+    def _decode(self, final):
+        """Decode the next value, None if it may not be complete yet"""
+        try:
+            value, end = _DECODER.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise
+            return None
+        # A number or literal is only complete once followed by a delimiter,
+        # 1. may go on as 1.25 in the next chunk
+        if (
+            not final
+            and not isinstance(value, (dict, list, str))
+            and (end == len(self._buffer) or self._buffer[end] not in _DELIMITERS)
+        ):
+            return None
+        self._pos = end
+        return (value,)
+
+    def _parse_buffer(self, final):
+        while self._state != "done" and self._skip_whitespace():
+            char = self._buffer[self._pos]
+            if self._state == "object":
+                self._expect("{")
+                self._state = "first_key"
+            elif self._state in ("first_key", "key"):
+                # Only an empty object closes before its first key
+                if self._state == "first_key" and char == "}":
+                    self._pos += 1
+                    self._state = "done"
+                    continue
+                decoded = self._decode(final)
+                if decoded is None:
+                    return
+                self._member = decoded[0]
+                self._state = "colon"
+            elif self._state == "colon":
+                self._expect(":")
+                self._state = "value"
+            elif self._state == "value":
+                if self._member == self._key and char == "[":
+                    self._pos += 1
+                    self._state = "first_item"
+                    continue
+                decoded = self._decode(final)
+                if decoded is None:
+                    return
+                # A null item list holds no items
+                if self._member == self._key and decoded[0] is not None:
+                    raise ValueError("Invalid {} data".format(self._key))
+                self._state = "comma"
+            elif self._state in ("first_item", "items", "item"):
+                # No closing bracket straight after a comma
+                if self._state != "items" and char == "]":
+                    self._pos += 1
+                    self._state = "comma"
+                    continue
+                if self._state == "item":
+                    self._expect(",")
+                    self._state = "items"
+                    continue
+                decoded = self._decode(final)
+                if decoded is None:
+                    return
+                record = self._parse(decoded[0])
+                if record is not None:
+                    self.items[record.name] = record
+                self._state = "item"
+            elif self._state == "comma":
+                if char == "}":
+                    self._pos += 1
+                    self._state = "done"
+                else:
+                    self._expect(",")
+                    self._state = "key"
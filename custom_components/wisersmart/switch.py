@@ -7,94 +7,54 @@ thomas.fayoux@gmail.com
 """
 
 import asyncio
-import voluptuous as vol
 
-import homeassistant.helpers.config_validation as cv
 from homeassistant.components.switch import SwitchEntity
-from homeassistant.const import ATTR_ENTITY_ID
 from homeassistant.core import callback
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
 
 import homeassistant.components.input_select as input_select
 
-from .const import _LOGGER, DOMAIN, MANUFACTURER, WISER_SMART_SERVICES
-
-ATTR_APPLIANCE_STATE = "appliance_state"
-SET_APPLIANCE_MODE_SCHEMA = vol.Schema(
-    {
-        vol.Required(ATTR_ENTITY_ID): cv.entity_id,
-        vol.Required(ATTR_APPLIANCE_STATE, default=False): vol.Coerce(str),
-    }
-)
-
-ATTR_HOME_MODE = "mode"
-ATTR_COME_BACK_TIME = "come_back_time"
-SET_HOME_MODE_SCHEMA = vol.Schema(
-    {
-        vol.Required(ATTR_HOME_MODE): vol.Coerce(str),
-        vol.Required(ATTR_COME_BACK_TIME, default=0): vol.Coerce(int),
-    }
-)
+from .const import _LOGGER, DOMAIN
+from .api import SECTION_APPLIANCES
+from .snapshot import KIND_APPLIANCE, update_signal
+from .topology import device_identifier
+from .writes import DEADBAND_POWER, WiserSmartFilteredEntity
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
     """Add the Wiser Smart System Switch entities"""
-    data = hass.data[DOMAIN]
+    data = hass.data[DOMAIN][config_entry.entry_id]
 
     # Add appliances (if any)
-    if data.wiserSmart.getWiserAppliances() is not None:
+    if data.snapshot.appliances:
         wiserSmart_appliances = [
-            WiserSmartAppliance(data, appliance.get("applianceName"), "WiserSmart - Plug - {}".format(appliance.get("applianceName")))
-            for appliance in data.wiserSmart.getWiserAppliances()
+            WiserSmartAppliance(data, appliance_name, "WiserSmart - Plug - {}".format(appliance_name))
+            for appliance_name in data.snapshot.appliances
         ]
         async_add_entities(wiserSmart_appliances)
 
-    @callback
-    def set_appliance_state(service):
-        entity_id = service.data[ATTR_ENTITY_ID]
-        appliance_mode = service.data[ATTR_APPLIANCE_STATE]
-        print("data = {} {}".format(entity_id, appliance_mode))
-
-        for appliance in wiserSmart_appliances:
-
-            if appliance.entity_id == entity_id:
-                hass.async_create_task(appliance.set_appliance_mode(appliance_mode))
-            appliance.schedule_update_ha_state(True)
-            break
-
-    @callback
-    def set_home_mode(service):
-        home_mode = service.data[ATTR_HOME_MODE]
-        come_back_time = service.data[ATTR_COME_BACK_TIME]
-        hass.async_create_task(data.set_home_mode(home_mode, come_back_time))
-
-    """ Register Services """
-    hass.services.async_register(
-        DOMAIN,
-        WISER_SMART_SERVICES["SERVICE_SET_APPLIANCE_STATE"],
-        set_appliance_state,
-        schema=SET_APPLIANCE_MODE_SCHEMA,
-    )
-    """ Register Service """
-    hass.services.async_register(
-        DOMAIN,
-        WISER_SMART_SERVICES["SERVICE_SET_HOME_MODE"],
-        set_home_mode,
-        schema=SET_HOME_MODE_SCHEMA,
-    )
     return True
 
-class WiserSmartAppliance(SwitchEntity):
+class WiserSmartAppliance(WiserSmartFilteredEntity, SwitchEntity):
+    write_deadbands = {"power_consumption": DEADBAND_POWER}
+    # Controller data sections the entity reads
+    data_sections = frozenset([SECTION_APPLIANCES])
+
     def __init__(self, data, applianceId, name):
         """Initialize the sensor."""
         _LOGGER.info("{} Appliance Init".format(name))
         self.appliance_name = name
         self.appliance_id = applianceId
+        self.command_items = ((KIND_APPLIANCE, applianceId),)
         self.data = data
         self._is_on = False
+        self._device_info = {
+            **data.topology.device(applianceId).device_info,
+            "name": name,
+        }
 
     @property
     def unique_id(self):
-        return "WiserSmart - {}".format(self.appliance_id)
+        return device_identifier(self.appliance_id, self.data.id_controller)
 
     @property
     def icon(self):
@@ -103,20 +63,18 @@ class WiserSmartAppliance(SwitchEntity):
     @property
     def device_info(self):
         """Return device specific attributes."""
-        model = self.data.wiserSmart.getWiserDeviceInfo(self.appliance_id).get("modelId")
-
-        return {
-            "name": self.appliance_name,
-            "identifiers": {(DOMAIN, self.unique_id)},
-            "manufacturer": MANUFACTURER,
-            "model": model,
-        }
+        return self._device_info
 
     @property
     def name(self):
         """Return the name of the appliance """
         return self.appliance_name
 
+    @property
+    def available(self):
+        """Unavailable until cached data is confirmed by the controller"""
+        return not self.data.is_stale(self.data_sections)
+
     @property
     def should_poll(self):
         """Return the polling state."""
@@ -125,7 +83,7 @@ class WiserSmartAppliance(SwitchEntity):
     @property
     def is_on(self):
         """Return true if device is on."""
-        self._is_on = self.data.wiserSmart.getWiserApplianceInfo(self.appliance_id).get("state")
+        self._is_on = self.data.snapshot.appliance(self.appliance_id).state
         _LOGGER.debug(
             "Appliance {} is currently {}".format(self.appliance_id, self._is_on)
         )
@@ -134,8 +92,8 @@ class WiserSmartAppliance(SwitchEntity):
     @property
     def device_state_attributes(self):
         attrs = {}
-        device_data = self.data.wiserSmart.getWiserApplianceInfo(self.appliance_id)
-        attrs["power_consumption"] = device_data.get("powerConsump")
+        device_data = self.data.snapshot.appliance(self.appliance_id)
+        attrs["power_consumption"] = device_data.power
         return attrs
 
     async def async_turn_on(self, **kwargs):
@@ -150,9 +108,24 @@ class WiserSmartAppliance(SwitchEntity):
 
     async def async_added_to_hass(self):
         """Subscribe for update from the Controller"""
+        # Services find the appliance from its entity id
+        self.data.appliance_entities[self.entity_id] = self
+        # Written once the entity is added
+        self.async_filter_state_write()
 
-        async def async_update_state():
+        @callback
+        def async_update_state():
             """Update sensor state."""
-            await self.async_update_ha_state(False)
+            self.async_write_filtered_state()
+
+        self.async_on_remove(
+            async_dispatcher_connect(
+                self.hass,
+                update_signal(self.data.entry_id, KIND_APPLIANCE, self.appliance_id),
+                async_update_state,
+            )
+        )
 
-        async_dispatcher_connect(self.hass, "WiserSmartUpdateMessage", async_update_state)
+    async def async_will_remove_from_hass(self):
+        """Remove the appliance from the service index"""
+        self.data.appliance_entities.pop(self.entity_id, None)
@@ -0,0 +1,100 @@
+"""
+Device topology of a Wiser Smart Controller
+
+Built once per device list from the snapshot: the model, room, power type
+and parent Home Assistant device of every controller device, with its
+device info ready to hand to the entities.
+
+https://github.com/tomtomfx/wiserSmartForHA
+thomas.fayoux@gmail.com
+
+"""
+from types import MappingProxyType
+
+from .const import DOMAIN, MANUFACTURER
+
+# Thermostats, heaters and valves belong to the device of their room
+ROOM_MODELS = frozenset(["EH-ZB-RTS", "EH-ZB-HACT", "EH-ZB-VACT"])
+ROOM_MODEL = "Wiser Smart Room"
+
+
+def controller_unique_id(unique_id, controller):
+    """
+    Add the controller name to the unique id of one of its items
+    Rooms, devices and appliances of two controllers may have the same name.
+    :param controller: controller name, None to keep the id unchanged
+    """
+    if controller is None:
+        return unique_id
+    return "{}-{}".format(unique_id, controller)
+
+
+def room_identifier(room_id, controller=None):
+    return controller_unique_id("WiserSmartRoom - {}".format(room_id), controller)
+
+
+def room_device_info(room_id, controller=None):
+    """Return the device info of the Home Assistant device of a room"""
+    return {
+        "name": "WiserSmart - Thermostat - {}".format(room_id),
+        "identifiers": {(DOMAIN, room_identifier(room_id, controller))},
+        "manufacturer": MANUFACTURER,
+        "model": ROOM_MODEL,
+    }
+
+
+def device_identifier(device_id, controller=None):
+    return controller_unique_id("WiserSmart - {}".format(device_id), controller)
+
+
+class DeviceTopology:
+    """Static description of one controller device"""
+
+    __slots__ = ("device_id", "model", "room", "power_type", "parent_identifier", "device_info")
+
+    def __init__(self, device_id, model, room, power_type, controller=None):
+        self.device_id = device_id
+        self.model = model
+        self.room = room
+        self.power_type = power_type
+        if model in ROOM_MODELS:
+            self.parent_identifier = room_identifier(room, controller)
+            model = ROOM_MODEL
+        else:
+            self.parent_identifier = device_identifier(device_id, controller)
+        self.device_info = MappingProxyType(
+            {
+                "identifiers": {(DOMAIN, self.parent_identifier)},
+                "manufacturer": MANUFACTURER,
+                "model": model,
+            }
+        )
+
+
+class WiserSmartTopology:
+    """Topology of every device of a snapshot"""
+
+    def __init__(self, devices, controller=None):
+        """
+        :param devices: the snapshot device index the topology is built from
+        :param controller: controller name held by the identifiers, see controller_unique_id
+        """
+        self.devices = devices
+        self._controller = controller
+        self._devices = {
+            device_id: DeviceTopology(
+                device_id,
+                device.model,
+                device.location,
+                device.power_type,
+                controller,
+            )
+            for device_id, device in devices.items()
+        }
+
+    def device(self, device_id):
+        """Return the topology of a device, unknown devices get their own device"""
+        topology = self._devices.get(device_id)
+        if topology is None:
+            topology = DeviceTopology(device_id, None, None, None, self._controller)
+        return topology
@@ -0,0 +1,175 @@
+"""
+Command latency tracing for Wiser Smart
+
+Every command gets a trace id and is timestamped when it is received, when
+the controller write completes, when the entity showing it writes its
+state and when the read back confirms it.
+
+https://github.com/tomtomfx/wiserSmartForHA
+thomas.fayoux@gmail.com
+
+"""
+from collections import deque
+from time import monotonic
+import uuid
+
+from homeassistant.core import callback
+
+from .const import _LOGGER, COMMAND_TRACE_WINDOW
+from .stats import RollingStat
+
+# Stages of a command, measured from its reception
+STAGE_WRITTEN = "written"
+STAGE_STATE_WRITTEN = "state_written"
+STAGE_CONFIRMED = "confirmed"
+COMMAND_STAGES = [STAGE_WRITTEN, STAGE_STATE_WRITTEN, STAGE_CONFIRMED]
+
+
+class CommandTrace:
+    """Timestamps of one command"""
+
+    __slots__ = (
+        "trace_id",
+        "command",
+        "kind",
+        "item_id",
+        "received",
+        "written",
+        "state_written",
+        "confirmed",
+        "outcome",
+    )
+
+    def __init__(self, command, kind, item_id):
+        self.trace_id = uuid.uuid4().hex[:12]
+        self.command = command
+        self.kind = kind
+        self.item_id = item_id
+        self.received = monotonic()
+        self.written = None
+        self.state_written = None
+        self.confirmed = None
+        self.outcome = None
+
+    def latency(self, stage):
+        """Return the seconds from reception to a stage, None if not reached"""
+        timestamp = getattr(self, stage)
+        if timestamp is None:
+            return None
+        return timestamp - self.received
+
+    def as_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "command": self.command,
+            "item": self.item_id,
+            "outcome": self.outcome,
+            **{stage: self.latency(stage) for stage in COMMAND_STAGES},
+        }
+
+
+class WiserSmartCommandTracer:
+    """Open command traces of one controller and their latencies per command"""
+
+    def __init__(self, size=COMMAND_TRACE_WINDOW):
+        self._size = size
+        self._open = {}
+        self.recent = deque(maxlen=size)
+        self.latencies = {}
+
+    @callback
+    def async_start(self, command, kind, item_id):
+        """Open the trace of a command as it is received"""
+        trace = CommandTrace(command, kind, item_id)
+        self._open.setdefault((kind, item_id), []).append(trace)
+        _LOGGER.debug(
+            "Wiser Smart command {} {} {} received".format(trace.trace_id, command, item_id)
+        )
+        return trace
+
+    def _traces(self, items):
+        for item in items:
+            for trace in self._open.get(item, ()):
+                yield trace
+
+    @callback
+    def async_written(self, items):
+        """The controller write of these (kind, item_id) completed"""
+        now = monotonic()
+        for trace in self._traces(items):
+            if trace.written is None:
+                trace.written = now
+                _LOGGER.debug(
+                    "Wiser Smart command {} written after {:.3f}s".format(
+                        trace.trace_id, now - trace.received
+                    )
+                )
+
+    @callback
+    def async_state_written(self, items):
+        """The entities of these (kind, item_id) wrote their state"""
+        now = monotonic()
+        for trace in self._traces(items):
+            if trace.written is not None and trace.state_written is None:
+                trace.state_written = now
+
+    @callback
+    def async_confirmed(self, items):
+        """The read back of these (kind, item_id) completed"""
+        now = monotonic()
+        for item in items:
+            for trace in self._open.get(item, ()):
+                if trace.written is None:
+                    continue
+                # No state change on read back, the value was already shown
+                if trace.state_written is None:
+                    trace.state_written = now
+                trace.confirmed = now
+                self._close(trace, "confirmed")
+            self._open[item] = [
+                trace for trace in self._open.get(item, ()) if trace.outcome is None
+            ]
+            if not self._open[item]:
+                del self._open[item]
+
+    @callback
+    def async_failed(self, items, outcome="failed"):
+        """The controller write or the read back of these (kind, item_id) failed"""
+        for item in items:
+            for trace in self._open.pop(item, ()):
+                self._close(trace, outcome)
+
+    def _close(self, trace, outcome):
+        trace.outcome = outcome
+        self.recent.append(trace)
+        if outcome != "confirmed":
+            return
+        stats = self.latencies.setdefault(
+            trace.command,
+            {stage: RollingStat(self._size) for stage in COMMAND_STAGES},
+        )
+        for stage in COMMAND_STAGES:
+            stats[stage].add(trace.latency(stage))
+        _LOGGER.debug(
+            "Wiser Smart command {} {} {}: {}".format(
+                trace.trace_id, trace.command, trace.item_id, trace.as_dict()
+            )
+        )
+
+    def as_dict(self):
+        """Return the latency percentiles per command and the recent traces"""
+        return {
+            "latencies": {
+                command: {
+                    stage: {
+                        "last": stat.last,
+                        "p50": stat.p50,
+                        "p95": stat.p95,
+                    }
+                    for stage, stat in stages.items()
+                }
+                for command, stages in self.latencies.items()
+            },
+            "pending": len(list(self._traces(list(self._open)))),
+            "recent": [trace.as_dict() for trace in self.recent],
+        }
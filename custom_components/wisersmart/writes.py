@@ -0,0 +1,132 @@
+"""
+State write filtering for Wiser Smart
+
+Entities are notified whenever their controller data changed, but only
+write their state when one of its values changed by more than its deadband,
+or when the last write is older than the maximum state age.
+
+https://github.com/tomtomfx/wiserSmartForHA
+thomas.fayoux@gmail.com
+
+"""
+from numbers import Number
+from time import monotonic
+
+from homeassistant.core import callback
+
+# Kinds of values with a configurable deadband
+DEADBAND_TEMPERATURE = "temperature"
+DEADBAND_POWER = "power"
+
+# Absorbs float rounding, 20.3 - 20.2 is below 0.1
+_EPSILON = 1e-6
+
+
+class Deadband:
+    """Smallest change of a value worth writing"""
+
+    __slots__ = ("absolute", "relative")
+
+    def __init__(self, absolute=0, relative=0):
+        """
+        :param absolute: change in the unit of the value
+        :param relative: change in percent of the last written value
+        """
+        self.absolute = absolute
+        self.relative = relative
+
+    def changed(self, previous, value):
+        """Return whether value is worth writing over previous"""
+        if (
+            not isinstance(previous, Number)
+            or not isinstance(value, Number)
+            or isinstance(value, bool)
+        ):
+            return previous != value
+        if previous == value:
+            return False
+        # Always show a value going to or leaving zero
+        if not previous or not value:
+            return True
+        threshold = max(self.absolute, abs(previous) * self.relative / 100)
+        return abs(value - previous) >= threshold - _EPSILON
+
+
+EXACT = Deadband()
+
+
+class StateWriteFilter:
+    """Values of the last state written by one entity"""
+
+    __slots__ = ("_written", "_written_at")
+
+    def __init__(self):
+        self._written = None
+        self._written_at = None
+
+    def should_write(self, values, deadbands, max_age):
+        """
+        Return whether the state is worth writing, and remember it if so
+        :param values: dict of name to value the entity state is made of
+        :param deadbands: dict of name to Deadband, values not in it compare exactly
+        :param max_age: seconds after which the state is written anyway
+        """
+        now = monotonic()
+        if (
+            self._written is None
+            or now - self._written_at >= max_age
+            or values.keys() != self._written.keys()
+            or any(
+                deadbands.get(name, EXACT).changed(self._written[name], value)
+                for name, value in values.items()
+            )
+        ):
+            self._written = values
+            self._written_at = now
+            return True
+        return False
+
+
+class WiserSmartFilteredEntity:
+    """Mixin for entities writing their state through a StateWriteFilter"""
+
+    # Value name to the kind of its deadband
+    write_deadbands = {}
+    # (kind, item_id) whose commands are shown once the state is written
+    command_items = ()
+
+    _write_filter = None
+
+    def write_values(self):
+        """Return the values the state of the entity is made of"""
+        return {
+            "available": self.available,
+            "state": self.state,
+            **(getattr(self, "device_state_attributes", None) or {}),
+            **(getattr(self, "extra_state_attributes", None) or {}),
+        }
+
+    @callback
+    def async_filter_state_write(self):
+        """Return whether the state changed enough since it was last written"""
+        if self._write_filter is None:
+            self._write_filter = StateWriteFilter()
+        return self._write_filter.should_write(
+            self.write_values(),
+            {
+                name: self.data.deadbands[kind]
+                for name, kind in self.write_deadbands.items()
+            },
+            self.data.state_max_age,
+        )
+
+    @callback
+    def async_write_filtered_state(self):
+        """Write the state unless it is within the deadbands of the last one"""
+        if self.async_filter_state_write():
+            self.data.state_writes["written"] += 1
+            self.async_write_ha_state()
+            if self.command_items:
+                self.data.tracer.async_state_written(self.command_items)
+        else:
+            self.data.state_writes["suppressed"] += 1
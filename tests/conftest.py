@@ -0,0 +1,5 @@
+"""Make the integration importable as custom_components.wisersmart"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
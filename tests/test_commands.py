@@ -0,0 +1,121 @@
+"""Tests of the command queue coalescing controller writes"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from homeassistant.core import HomeAssistant  # noqa: E402
+
+from custom_components.wisersmart.commands import WiserSmartCommandQueue  # noqa: E402
+
+WINDOW = 0.01
+
+
+class FakeController:
+    """Records the batches sent, each one held until released if asked"""
+
+    def __init__(self):
+        self.batches = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.release = None
+        self.error = None
+
+    async def async_send_batch(self, commands):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.release is not None:
+                await self.release.wait()
+            if self.error is not None:
+                raise self.error
+            self.batches.append(dict(commands))
+        finally:
+            self.in_flight -= 1
+
+
+def run(test, tmp_path):
+    async def async_run():
+        hass = HomeAssistant(str(tmp_path))
+        controller = FakeController()
+        queue = WiserSmartCommandQueue(hass, controller.async_send_batch, window=WINDOW)
+        try:
+            await test(queue, controller)
+        finally:
+            queue.async_cancel()
+            await hass.async_stop(force=True)
+
+    asyncio.run(async_run())
+
+
+def test_writes_coalesced(tmp_path):
+    async def test(queue, controller):
+        await asyncio.gather(
+            queue.async_send("room", "Lounge", 20.0),
+            queue.async_send("room", "Lounge", 21.0),
+            queue.async_send_many({("appliance", "Plug"): True, ("room", "Kitchen"): 19.0}),
+        )
+        assert controller.batches == [
+            {
+                ("room", "Lounge"): 21.0,
+                ("appliance", "Plug"): True,
+                ("room", "Kitchen"): 19.0,
+            }
+        ]
+
+    run(test, tmp_path)
+
+
+def test_one_batch_in_flight(tmp_path):
+    async def test(queue, controller):
+        controller.release = asyncio.Event()
+        first = asyncio.ensure_future(queue.async_send("room", "Lounge", 20.0))
+        while not controller.in_flight:
+            await asyncio.sleep(0)
+        # Queued while the first batch is sent, they go together afterwards
+        second = asyncio.ensure_future(queue.async_send("room", "Lounge", 22.0))
+        await asyncio.sleep(WINDOW * 3)
+        third = asyncio.ensure_future(queue.async_send("room", "Lounge", 23.0))
+        await asyncio.sleep(WINDOW * 3)
+        assert controller.in_flight == 1
+        assert not second.done()
+        controller.release.set()
+        await asyncio.gather(first, second, third)
+        assert controller.max_in_flight == 1
+        assert controller.batches == [
+            {("room", "Lounge"): 20.0},
+            {("room", "Lounge"): 23.0},
+        ]
+
+    run(test, tmp_path)
+
+
+def test_failed_batch_raised_to_every_writer(tmp_path):
+    async def test(queue, controller):
+        controller.error = RuntimeError("controller unreachable")
+        results = await asyncio.gather(
+            queue.async_send("room", "Lounge", 20.0),
+            queue.async_send("appliance", "Plug", True),
+            return_exceptions=True,
+        )
+        assert all(isinstance(result, RuntimeError) for result in results)
+        # The next batch is sent again
+        controller.error = None
+        await queue.async_send("room", "Lounge", 21.0)
+        assert controller.batches == [{("room", "Lounge"): 21.0}]
+
+    run(test, tmp_path)
+
+
+def test_cancel_drops_pending_writes(tmp_path):
+    async def test(queue, controller):
+        write = asyncio.ensure_future(queue.async_send("room", "Lounge", 20.0))
+        await asyncio.sleep(0)
+        queue.async_cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await write
+        await asyncio.sleep(WINDOW * 3)
+        assert controller.batches == []
+
+    run(test, tmp_path)
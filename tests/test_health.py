@@ -0,0 +1,139 @@
+"""Tests of the circuit breaker of the controller connection"""
+import importlib.util
+import os
+import sys
+import types
+
+import pytest
+
+# health.py only needs the standard library and const.py, load both without
+# the integration under a package of their own
+_DIR = os.path.join(os.path.dirname(__file__), "..", "custom_components", "wisersmart")
+_PACKAGE = "wisersmart_health"
+sys.modules.setdefault(_PACKAGE, types.ModuleType(_PACKAGE)).__path__ = [_DIR]
+
+
+def _load(name):
+    spec = importlib.util.spec_from_file_location(
+        "{}.{}".format(_PACKAGE, name), os.path.join(_DIR, "{}.py".format(name))
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+_load("const")
+health = _load("health")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(health, "monotonic", clock)
+    # Longest jittered delay, so that waiting the full delay always allows a probe
+    monkeypatch.setattr(health.random, "uniform", lambda low, high: high)
+    return clock
+
+
+def breaker():
+    return health.WiserSmartConnectionHealth(
+        failure_threshold=3, base_delay=10, max_delay=40
+    )
+
+
+def open_circuit(circuit):
+    for _ in range(circuit.failure_threshold):
+        circuit.record_failure()
+
+
+def test_opens_after_threshold(clock):
+    circuit = breaker()
+    for _ in range(2):
+        circuit.record_failure()
+        assert circuit.state == health.STATE_CLOSED
+        assert circuit.allow_request()
+    circuit.record_failure()
+    assert circuit.state == health.STATE_OPEN
+    assert not circuit.allow_request()
+    assert circuit.retry_in == 10
+
+
+def test_success_resets_failures(clock):
+    circuit = breaker()
+    circuit.record_failure()
+    circuit.record_failure()
+    circuit.record_success()
+    circuit.record_failure()
+    assert circuit.state == health.STATE_CLOSED
+    assert circuit.failures == 1
+
+
+def test_single_probe_while_half_open(clock):
+    circuit = breaker()
+    open_circuit(circuit)
+    clock.now += 9
+    assert not circuit.allow_request()
+    clock.now += 1
+    assert circuit.allow_request()
+    assert circuit.state == health.STATE_HALF_OPEN
+    assert circuit.retry_in == 0
+    # Other requests wait for the outcome of the probe
+    assert not circuit.allow_request()
+    assert not circuit.allow_request()
+
+
+def test_probe_success_closes(clock):
+    circuit = breaker()
+    open_circuit(circuit)
+    clock.now += 10
+    assert circuit.allow_request()
+    circuit.record_success()
+    assert circuit.state == health.STATE_CLOSED
+    assert circuit.failures == 0
+    assert circuit.allow_request()
+    assert circuit.allow_request()
+
+
+def test_probe_failure_doubles_backoff(clock):
+    circuit = breaker()
+    open_circuit(circuit)
+    clock.now += 10
+    assert circuit.allow_request()
+    circuit.record_failure()
+    assert circuit.state == health.STATE_OPEN
+    assert circuit.retry_in == 20
+    clock.now += 19
+    assert not circuit.allow_request()
+    clock.now += 1
+    # A new probe is allowed once the longer delay is over
+    assert circuit.allow_request()
+    assert not circuit.allow_request()
+
+
+def test_backoff_capped(clock):
+    circuit = breaker()
+    open_circuit(circuit)
+    delays = []
+    for _ in range(5):
+        delays.append(circuit.retry_in)
+        clock.now += circuit.retry_in
+        assert circuit.allow_request()
+        circuit.record_failure()
+    assert delays == [10, 20, 40, 40, 40]
+
+
+def test_backoff_jitter(monkeypatch):
+    circuit = breaker()
+    monkeypatch.setattr(health.random, "uniform", lambda low, high: low)
+    open_circuit(circuit)
+    # Equal jitter, between half and the whole delay
+    assert circuit.backoff() == 5
@@ -0,0 +1,133 @@
+"""Tests of polls overlapping with writes and read backs of the same items"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from homeassistant.const import CONF_NAME  # noqa: E402
+from homeassistant.core import HomeAssistant  # noqa: E402
+
+from custom_components.wisersmart import WiserSmartControllerHandle  # noqa: E402
+from custom_components.wisersmart.api import (  # noqa: E402
+    SECTION_APPLIANCES,
+    SECTION_TEMPERATURES,
+)
+from custom_components.wisersmart.const import CONF_OPTIMISTIC_UPDATES  # noqa: E402
+from custom_components.wisersmart.snapshot import (  # noqa: E402
+    KIND_ROOM,
+    WiserSmartSnapshot,
+)
+
+
+class FakeClient:
+    """Controller answering with its data as it was when the request was received"""
+
+    def __init__(self):
+        self.rooms = {"Lounge": (19.0, 20.0), "Kitchen": (18.0, 20.0)}
+        self.plug = False
+        self.requests = 0
+        self._held = None
+
+    def data(self, sections):
+        data = {}
+        if SECTION_TEMPERATURES in sections:
+            data[SECTION_TEMPERATURES] = {
+                "locationTempDetails": [
+                    {"locationName": name, "currentValue": current, "targetValue": target}
+                    for name, (current, target) in self.rooms.items()
+                ]
+            }
+        if SECTION_APPLIANCES in sections:
+            data[SECTION_APPLIANCES] = {
+                "applianceDetails": [
+                    {"applianceName": "Plug", "applianceId": 1, "state": self.plug}
+                ]
+            }
+        return data
+
+    def hold_next(self):
+        """Hold the answer to the next request until the returned event is set"""
+        self._held = asyncio.Event()
+        return self._held
+
+    async def async_get_data(self, sections, parsers=None, transfer=None):
+        self.requests += 1
+        data = self.data(sections)
+        held, self._held = self._held, None
+        if held is not None:
+            await held.wait()
+        return data
+
+
+async def async_wait_for_request(client, requests):
+    while client.requests < requests:
+        await asyncio.sleep(0)
+
+
+def run(test, tmp_path):
+    async def async_run():
+        hass = HomeAssistant(str(tmp_path))
+        entry = SimpleNamespace(
+            entry_id="entry",
+            data={CONF_NAME: "WiserHub", CONF_OPTIMISTIC_UPDATES: True},
+        )
+        handle = WiserSmartControllerHandle(hass, entry, "127.0.0.1", "admin", "secret")
+        handle.client = FakeClient()
+        handle.snapshot = WiserSmartSnapshot.from_data(
+            handle.client.data([SECTION_TEMPERATURES, SECTION_APPLIANCES])
+        )
+        try:
+            await test(handle, handle.client)
+        finally:
+            await handle.async_shutdown()
+            await hass.async_stop(force=True)
+
+    asyncio.run(async_run())
+
+
+def test_poll_started_before_write_keeps_written_item(tmp_path):
+    async def test(handle, client):
+        release = client.hold_next()
+        poll = asyncio.ensure_future(handle.async_update(sections=[SECTION_TEMPERATURES]))
+        await async_wait_for_request(client, 1)
+        # Written while the poll is running, the poll answer predates it
+        client.rooms["Kitchen"] = (18.5, 20.0)
+        await handle.async_after_commands(
+            [(KIND_ROOM, "Lounge", {"target_temperature": 22.0})]
+        )
+        assert handle.snapshot.room("Lounge").target_temperature == 22.0
+        release.set()
+        assert await poll
+        assert handle.snapshot.room("Lounge").target_temperature == 22.0
+        # Other items of the poll are still taken
+        assert handle.snapshot.room("Kitchen").current_temperature == 18.0
+
+    run(test, tmp_path)
+
+
+def test_poll_started_before_read_back_keeps_read_item(tmp_path):
+    async def test(handle, client):
+        release = client.hold_next()
+        poll = asyncio.ensure_future(handle.async_update(sections=[SECTION_APPLIANCES]))
+        await async_wait_for_request(client, 1)
+        client.plug = True
+        assert await handle.async_refresh_appliance("Plug")
+        assert handle.snapshot.appliance("Plug").state is True
+        release.set()
+        assert await poll
+        assert handle.snapshot.appliance("Plug").state is True
+
+    run(test, tmp_path)
+
+
+def test_poll_started_after_read_back_applies(tmp_path):
+    async def test(handle, client):
+        client.plug = True
+        assert await handle.async_refresh_appliance("Plug")
+        client.plug = False
+        assert await handle.async_update(sections=[SECTION_APPLIANCES])
+        assert handle.snapshot.appliance("Plug").state is False
+
+    run(test, tmp_path)
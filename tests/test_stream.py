@@ -0,0 +1,93 @@
+"""Tests of the incremental parser of the controller item lists"""
+import importlib.util
+import json
+import os
+from collections import namedtuple
+
+import pytest
+
+# stream.py only needs the standard library, load it without the integration
+_SPEC = importlib.util.spec_from_file_location(
+    "wisersmart_stream",
+    os.path.join(
+        os.path.dirname(__file__), "..", "custom_components", "wisersmart", "stream.py"
+    ),
+)
+stream = importlib.util.module_from_spec(_SPEC)
+_SPEC.loader.exec_module(stream)
+
+Item = namedtuple("Item", ["name", "value"])
+
+
+def parse(item):
+    if not isinstance(item, dict) or "name" not in item:
+        return None
+    return Item(item["name"], item.get("value"))
+
+
+def parse_whole(body, key="items"):
+    """Reference result, the body decoded at once"""
+    items = json.loads(body).get(key) or []
+    return {record.name: record for record in map(parse, items) if record is not None}
+
+
+def parse_chunks(body, size, key="items"):
+    parser = stream.JSONItemStream(key, parse)
+    for start in range(0, len(body), size):
+        parser.feed(body[start : start + size])
+    return parser.close()
+
+
+BODIES = [
+    {"version": 1.25, "items": [{"name": "a", "value": 12.5}, {"name": "b"}]},
+    {"other": 12.5, "items": [{"name": "Séjour", "value": -1e-3}], "count": 10},
+    {"items": [{"name": "a", "value": True}, 3, {"bad": 1}], "flag": False, "none": None},
+    {"items": None, "version": 2},
+    {"items": []},
+    {},
+]
+
+
+@pytest.mark.parametrize("data", BODIES)
+def test_every_chunk_size(data):
+    body = json.dumps(data, ensure_ascii=False).encode()
+    expected = parse_whole(body)
+    for size in range(1, len(body) + 1):
+        assert parse_chunks(body, size) == expected, size
+
+
+def test_number_split_in_large_body():
+    data = {
+        "version": 1.25,
+        "items": [{"name": "item {}".format(i), "value": i / 7} for i in range(600)],
+    }
+    body = json.dumps(data, indent=1).encode()
+    split = body.index(b"1.25") + 2
+    parser = stream.JSONItemStream("items", parse)
+    parser.feed(body[:split])
+    parser.feed(body[split:])
+    assert parser.close() == parse_whole(body)
+
+
+@pytest.mark.parametrize("body", [b"", b"  \n"])
+def test_empty_body(body):
+    assert parse_chunks(body, 1) is None
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b'{"items": [{"name": "a"}',
+        b'{"items": 3}',
+        b"[1]",
+        b'{"version": 1.}',
+        b'{"items": []}x',
+        b'{"items": [{"name": "a"},,]}',
+        b'{"items": [1,]}',
+        b'{"a": 1,}',
+    ],
+)
+def test_invalid_body(body):
+    for size in range(1, len(body) + 1):
+        with pytest.raises(ValueError):
+            parse_chunks(body, size)
@@ -0,0 +1,102 @@
+"""Tests of the deadbands filtering entity state writes"""
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from custom_components.wisersmart import writes  # noqa: E402
+from custom_components.wisersmart.writes import (  # noqa: E402
+    EXACT,
+    Deadband,
+    StateWriteFilter,
+)
+
+
+@pytest.mark.parametrize(
+    "deadband, previous, value, changed",
+    [
+        (EXACT, 20.0, 20.0, False),
+        (EXACT, 20.0, 20.01, True),
+        (Deadband(0.1), 20.2, 20.25, False),
+        # Float rounding, 20.3 - 20.2 is below 0.1
+        (Deadband(0.1), 20.2, 20.3, True),
+        (Deadband(0.1), 20.3, 20.2, True),
+        (Deadband(5, 10), 100, 108, False),
+        (Deadband(5, 10), 100, 110, True),
+        (Deadband(5, 10), 20, 24, False),
+        (Deadband(5, 10), 20, 25, True),
+        # Going to or leaving zero is always shown
+        (Deadband(5), 3, 0, True),
+        (Deadband(5), 0, 3, True),
+        (Deadband(5), None, 3, True),
+        (Deadband(5), 3, None, True),
+        (Deadband(5), "heat", "off", True),
+        (Deadband(5), "heat", "heat", False),
+        (Deadband(5), False, True, True),
+    ],
+)
+def test_deadband(deadband, previous, value, changed):
+    assert deadband.changed(previous, value) is changed
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(writes, "monotonic", clock)
+    return clock
+
+
+DEADBANDS = {"temperature": Deadband(0.5)}
+
+
+def test_first_state_written(clock):
+    assert StateWriteFilter().should_write({"temperature": 20.0}, DEADBANDS, 900)
+
+
+def test_within_deadband_suppressed(clock):
+    write_filter = StateWriteFilter()
+    write_filter.should_write({"temperature": 20.0, "state": "heat"}, DEADBANDS, 900)
+    assert not write_filter.should_write(
+        {"temperature": 20.4, "state": "heat"}, DEADBANDS, 900
+    )
+    # Compared with the last state written, not the last one seen
+    assert write_filter.should_write(
+        {"temperature": 20.5, "state": "heat"}, DEADBANDS, 900
+    )
+    assert not write_filter.should_write(
+        {"temperature": 20.1, "state": "heat"}, DEADBANDS, 900
+    )
+
+
+def test_value_without_deadband_compared_exactly(clock):
+    write_filter = StateWriteFilter()
+    write_filter.should_write({"temperature": 20.0, "state": "heat"}, DEADBANDS, 900)
+    assert write_filter.should_write(
+        {"temperature": 20.0, "state": "off"}, DEADBANDS, 900
+    )
+
+
+def test_values_added_or_removed_written(clock):
+    write_filter = StateWriteFilter()
+    write_filter.should_write({"temperature": 20.0}, DEADBANDS, 900)
+    assert write_filter.should_write({"temperature": 20.0, "battery": 80}, DEADBANDS, 900)
+    assert write_filter.should_write({"temperature": 20.0}, DEADBANDS, 900)
+
+
+def test_written_after_max_age(clock):
+    write_filter = StateWriteFilter()
+    write_filter.should_write({"temperature": 20.0}, DEADBANDS, 900)
+    clock.now += 899
+    assert not write_filter.should_write({"temperature": 20.1}, DEADBANDS, 900)
+    clock.now += 1
+    assert write_filter.should_write({"temperature": 20.1}, DEADBANDS, 900)
+    # The age restarts from that write
+    clock.now += 899
+    assert not write_filter.should_write({"temperature": 20.1}, DEADBANDS, 900)